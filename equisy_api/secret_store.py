@@ -0,0 +1,246 @@
+'''
+Secrets for the settings modules.
+
+Nothing is imported, built or fetched until a secret is first asked for, so settings that use no
+secret (and every manage.py command run with them) never touch Azure. Configured from the environment,
+Django settings are not loaded yet when these run:
+
+SECRETS_BACKEND         azure, file or env. Default azure when AZURE_KEY_VAULT_URL is set, env otherwise
+AZURE_KEY_VAULT_URL     https://<your-key-vault-name>.vault.azure.net/
+SECRETS_FILE            JSON object {name: value} read by the file backend
+SECRETS_ENV_PREFIX      env backend reads "db-password" from <prefix>DB_PASSWORD, default SECRET_
+SECRETS_CACHE_TTL       seconds a fetched secret is reused, default 3600, 0 disables caching
+SECRETS_CACHE_FILE      encrypted on disk cache shared by workers and manage.py runs, needs SECRETS_CACHE_KEY
+SECRETS_CACHE_KEY       Fernet key of the cache file (cryptography.fernet.Fernet.generate_key())
+'''
+import abc
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+MISSING = object()
+
+
+class SecretNotFound(KeyError):
+    pass
+
+
+# Backends
+class SecretProvider(abc.ABC):
+    @abc.abstractmethod
+    def get(self, name):
+        '''
+        The value of secret `name`, raises SecretNotFound when there is none.
+        '''
+
+    def get_many(self, names):
+        '''
+        {name: value} of the names that exist.
+        '''
+        found = {}
+        for name in names:
+            try:
+                found[name] = self.get(name)
+            except SecretNotFound:
+                pass
+        return found
+
+
+class EnvProvider(SecretProvider):
+    def __init__(self, prefix='SECRET_'):
+        self.prefix = prefix
+
+    def variable(self, name):
+        return self.prefix + name.upper().replace('-', '_')
+
+    def get(self, name):
+        try:
+            return os.environ[self.variable(name)]
+        except KeyError:
+            raise SecretNotFound(name) from None
+
+
+class FileProvider(SecretProvider):
+    def __init__(self, path):
+        self.path       =   path
+        self.secrets    =   None
+
+    def get(self, name):
+        if self.secrets is None:
+            with open(self.path) as file:
+                self.secrets = json.load(file)
+        try:
+            return self.secrets[name]
+        except KeyError:
+            raise SecretNotFound(name) from None
+
+
+class AzureKeyVaultProvider(SecretProvider):
+    '''
+    The credential chain is probed by the first request, so the client is built on first use only.
+    Key Vault has no batch read, get_many() fetches in parallel over the one client.
+    '''
+
+    def __init__(self, vault_url, max_workers=8):
+        self.vault_url      =   vault_url
+        self.max_workers    =   max_workers
+        self._client        =   None
+        self.lock           =   threading.Lock()
+
+    @property
+    def client(self):
+        with self.lock:
+            if self._client is None:
+                from azure.identity         import DefaultAzureCredential
+                from azure.keyvault.secrets import SecretClient
+                self._client = SecretClient(vault_url=self.vault_url, credential=DefaultAzureCredential())
+        return self._client
+
+    def get(self, name):
+        from azure.core.exceptions import ResourceNotFoundError
+        try:
+            return self.client.get_secret(name).value
+        except ResourceNotFoundError:
+            raise SecretNotFound(name) from None
+
+    def get_many(self, names):
+        names = list(names)
+        if len(names) < 2:
+            return super().get_many(names)
+
+        def fetch(name):
+            try:
+                return name, self.get(name)
+            except SecretNotFound:
+                return name, MISSING
+
+        # Built before the threads start, they all share it
+        self.client
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(names))) as executor:
+            return {name: value for name, value in executor.map(fetch, names) if value is not MISSING}
+
+
+# Cache
+class SecretStore:
+    '''
+    Secrets of a provider, kept for `ttl` seconds in memory and, with a Fernet key, in an encrypted file.
+    '''
+
+    def __init__(self, provider, ttl=3600, cache_file=None, cache_key=None):
+        self.provider   =   provider
+        self.ttl        =   ttl
+        self.cache_file =   cache_file if cache_key else None
+        self.cache_key  =   cache_key
+        self.entries    =   None
+        self.lock       =   threading.RLock()
+
+    @property
+    def fernet(self):
+        from cryptography.fernet import Fernet
+        return Fernet(self.cache_key)
+
+    def load(self):
+        # {name: (value, expires)}, expires is a wall clock time so it holds across processes
+        self.entries = {}
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        from cryptography.fernet import InvalidToken
+        try:
+            with open(self.cache_file, 'rb') as file:
+                entries = json.loads(self.fernet.decrypt(file.read()))
+        except (OSError, ValueError, InvalidToken):
+            # Unreadable or written with another key, it is rebuilt on the next fetch
+            return
+        self.entries = {name: tuple(entry) for name, entry in entries.items()}
+
+    def save(self):
+        if not self.cache_file:
+            return
+        directory           =   os.path.dirname(os.path.abspath(self.cache_file))
+        descriptor, path    =   tempfile.mkstemp(dir=directory, prefix='.secrets-')
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(self.fernet.encrypt(json.dumps(self.entries).encode()))
+        os.replace(path, self.cache_file)
+
+    def cached(self, name):
+        entry = self.entries.get(name)
+        if entry is None or entry[1] < time.time():
+            return MISSING
+        return entry[0]
+
+    def prefetch(self, *names):
+        '''
+        Fetches every name not cached yet in one batch, settings call it before their get_secret() calls.
+        '''
+        if not self.ttl:
+            return
+        with self.lock:
+            if self.entries is None:
+                self.load()
+            missing = [name for name in names if self.cached(name) is MISSING]
+            if not missing:
+                return
+            expires = time.time() + self.ttl
+            for name, value in self.provider.get_many(missing).items():
+                self.entries[name] = (value, expires)
+            self.save()
+
+    def get(self, name, default=MISSING):
+        if self.ttl:
+            with self.lock:
+                self.prefetch(name)
+                value = self.cached(name)
+        else:
+            value = self.provider.get_many([name]).get(name, MISSING)
+        if value is MISSING:
+            if default is MISSING:
+                raise SecretNotFound(name)
+            return default
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries = {}
+            if self.cache_file and os.path.exists(self.cache_file):
+                os.remove(self.cache_file)
+
+
+def provider_from_env():
+    vault_url   =   os.environ.get('AZURE_KEY_VAULT_URL')
+    backend     =   os.environ.get('SECRETS_BACKEND') or ('azure' if vault_url else 'env')
+    if backend == 'azure':
+        return AzureKeyVaultProvider(vault_url)
+    if backend == 'file':
+        return FileProvider(os.environ['SECRETS_FILE'])
+    if backend == 'env':
+        return EnvProvider(os.environ.get('SECRETS_ENV_PREFIX', 'SECRET_'))
+    raise ValueError(f'Unknown SECRETS_BACKEND "{backend}", expected azure, file or env')
+
+
+_store      =   None
+_store_lock =   threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SecretStore(
+                provider    =   provider_from_env(),
+                ttl         =   int(os.environ.get('SECRETS_CACHE_TTL', 3600)),
+                cache_file  =   os.environ.get('SECRETS_CACHE_FILE'),
+                cache_key   =   os.environ.get('SECRETS_CACHE_KEY'),
+            )
+    return _store
+
+
+def get_secret(name, default=MISSING):
+    return get_store().get(name, default)
+
+
+def prefetch_secrets(*names):
+    get_store().prefetch(*names)
@@ -55,9 +55,8 @@ SHARED_APPS = (
     'tinymce',
     'jsoneditor',
 
-    'livereload',
-    'debug_toolbar',
     'simple_history',
+    'rest_framework',
 )
 
 TENANT_APPS = (
@@ -87,16 +86,21 @@ TENANT_DOMAIN_MODEL     =   "web.Domain"
 AUTH_USER_MODEL 		= 'users.TenantUser'
 
 AUTHENTICATION_BACKENDS = (
-    "tenant_users.permissions.backend.UserBackend",
+    "web.permission_backend.CachedUserBackend", # tenant_users UserBackend with a shared, per tenant permission cache
 )
 
+# Sessions read from SESSION_CACHE_ALIAS, written through to web.TenantSession per tenant (web/sessions.py)
+SESSION_ENGINE = 'web.sessions'
+
 MIDDLEWARE = [
-    'django_tenants.middleware.main.TenantMainMiddleware',
+    'web.tenant_cache.CachedTenantMainMiddleware', # TenantMainMiddleware with a hostname -> tenant cache
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'web.permission_backend.PermissionCacheMiddleware', # Loads the user's permissions once per request
+    'web.permissions.ObjectPermissionCacheMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
@@ -175,10 +179,14 @@ USE_TZ = True
 import os
 STATIC_URL = 'static/'
 STATIC_URL          =   '/static/'
-STATICFILES_DIRS    =   [
-    os.path.join(BASE_DIR, 'web/static'),
-]
+# web/static is found by the app directories finder, listing it here too would collect every file twice
+STATICFILES_DIRS    =   []
 STATIC_ROOT =   os.path.join(BASE_DIR, 'static')
+# collectstatic writes content hashed copies (e.g. jsoneditor.min.3f2a1b.js) that browsers can cache forever
+STORAGES    =   {
+    'default'       :   {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles'   :   {'BACKEND': 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'},
+}
 MEDIA_URL   =   '/media/'
 MEDIA_ROOT  =   os.path.join(BASE_DIR, 'media')
 
@@ -189,18 +197,26 @@ MEDIA_ROOT  =   os.path.join(BASE_DIR, 'media')
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
-# Azure Key Vault Settings
-from azure.identity import DefaultAzureCredential
-from azure.keyvault.secrets import SecretClient
+# Cache
+# Local memory by default, settings_prod.py points it at Redis so every worker sees the same entries and invalidations
+# (check web.E002). CACHE_BACKEND/CACHE_LOCATION override both. web.caching.make_key namespaces every key by tenant schema and generation.
+CACHES = {
+    'default': {
+        'BACKEND'       :   os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION'      :   os.environ.get('CACHE_LOCATION', 'equisy'),
+        'KEY_FUNCTION'  :   'web.caching.make_key',
+        'KEY_PREFIX'    :   'equisy',
+    }
+}
 
-key_vault_url   = "https://<your-key-vault-name>.vault.azure.net/"
-credential      = DefaultAzureCredential()
-client          = SecretClient(vault_url=key_vault_url, credential=credential)
 
-def get_secret(secret_name):
-    return client.get_secret(secret_name).value
+# Secrets
+# Azure Key Vault (or a file / env backend for tests and offline work), chosen by SECRETS_BACKEND,
+# see equisy_api/secret_store.py. No client is built and nothing is fetched until a secret is asked for.
+from equisy_api.secret_store import get_secret, prefetch_secrets
 
-# # Example usage
+# # Example usage, one batched fetch then reads from the cache
+# prefetch_secrets("django-secret-key", "db-name", "db-user", "db-password", "db-host", "db-port")
 # SECRET_KEY = get_secret("django-secret-key")
 # DATABASES = {
 #     'default': {
@@ -13,8 +13,12 @@ if DEBUG:
     MIDDLEWARE += ['debug_toolbar.middleware.DebugToolbarMiddleware']
 
 # INSTALLED APPS
+# Development only, settings.py lists what production loads
 if DEBUG:
-    INSTALLED_APPS += ['debug_toolbar']
+    INSTALLED_APPS += ['livereload', 'debug_toolbar']
+
+# runserver is a single process, the local memory cache is shared by all of it
+SILENCED_SYSTEM_CHECKS = ['web.E002']
 
 # DEBUG TOOLBAR INTERNAL IPS
 INTERNAL_IPS = [
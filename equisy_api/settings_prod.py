@@ -1 +1,18 @@
+import os
+
 from .settings import *
+
+
+# Production app profile: settings.py lists no development apps (livereload and debug_toolbar are
+# added by settings_dev.py), a worker imports only what serves requests. Measure with `manage.py startup_profile`.
+DEBUG           = False
+
+# Tenants are served from subdomains of PROJECT_URL
+ALLOWED_HOSTS   = [PROJECT_URL, f'.{PROJECT_URL}']
+
+# Cache
+# Shared by every worker: tenant purges, permission and session invalidations must reach all of them (check web.E002)
+CACHES['default'].update({
+    'BACKEND'   :   os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.redis.RedisCache'),
+    'LOCATION'  :   os.environ.get('CACHE_LOCATION', 'redis://localhost:6379/1'),
+})
@@ -16,15 +16,32 @@ Including another URLconf
 """
 from django.contrib             import admin
 from django.urls                import path, include
-from .settings                  import DEBUG
 from django.conf.urls.static    import static   # static file config
 from django.conf                import settings # static file config
+from web                        import views
+from web.api                    import build_router
 
 urlpatterns = [
     path('uzumymw/', admin.site.urls),
+
+    # Permission checked, range capable media
+    path('media/files/<int:pk>/',   views.file_master_media,    name='file_master_media'),
+    path('media/images/<int:pk>/',  views.image_master_media,   name='image_master_media'),
+
+    # Resumable chunked uploads into FileMaster
+    path('api/uploads/',                                    views.upload_create,    name='upload_create'),
+    path('api/uploads/<str:upload_id>/',                    views.upload_detail,    name='upload_detail'),
+    path('api/uploads/<str:upload_id>/chunks/<int:index>/', views.upload_chunk,     name='upload_chunk'),
+    path('api/uploads/<str:upload_id>/complete/',           views.upload_complete,  name='upload_complete'),
+
+    # Several API calls in one round trip
+    path('api/batch/',  views.batch,    name='api_batch'),
+
+    # REST API generated from the admin registry (web/api.py)
+    path('api/', include(build_router().urls)),
 ]
 
-if DEBUG:
+if settings.DEBUG and 'debug_toolbar' in settings.INSTALLED_APPS:
     import debug_toolbar
     urlpatterns += [path('__debug__/', include(debug_toolbar.urls))]
 
@@ -11,14 +11,24 @@ class APIBase {
             tokenKey        : config.tokenKey || 'jwtToken',        // Key for storing JWT token in local storage
             retryLimit      : config.retryLimit || 3,             // Number of retries for failed requests
             debounceDelay   : config.debounceDelay || 300,     // Delay for debouncing requests
+            uploadChunkSize : config.uploadChunkSize || 5 * 1024 * 1024, // Chunk size for resumable uploads
+            uploadParallel  : config.uploadParallel || 3,       // Chunks uploaded at the same time
+            batch           : config.batch || false,            // Coalesce calls made in the same tick into one /api/batch/ request
+            batchEndpoint   : config.batchEndpoint || '/api/batch/',
+            batchMaxSize    : config.batchMaxSize || 50,        // Must not exceed API_BATCH_MAX_REQUESTS on the server
             // Additional configurable parameters can be added here
         };
 
+        // Calls waiting for the next batch flush
+        this.batchQueue = [];
+
         // Creating an axios instance with the provided configuration
         this.apiClient = axios.create({
             baseURL: this.config.baseURL,
             headers: this.config.defaultHeaders,
             timeout: this.config.timeout,
+            xsrfCookieName: 'csrftoken',    // Django CSRF cookie / header for session authenticated calls
+            xsrfHeaderName: 'X-CSRFToken',
         });
 
         // Interceptors for handling request and response
@@ -61,13 +71,17 @@ class APIBase {
     };
 
     // General method to make an API request
-    async makeRequest(method, endpoint, data = null, headers = {}) {
+    async makeRequest(method, endpoint, data = null, headers = {}, params = {}) {
+        if (this.config.batch) {
+            return this.enqueueBatch(method, endpoint, data, headers, params);
+        }
         try {
             const response = await this.apiClient({
                 method,
                 url: endpoint,
                 data,
-                headers
+                headers,
+                params
             });
             return response.data;
         } catch (error) {
@@ -75,9 +89,65 @@ class APIBase {
         }
     }
 
+    // Auto-batching: calls made in the same tick are sent together on the next microtask
+    enqueueBatch(method, endpoint, data, headers, params) {
+        return new Promise((resolve, reject) => {
+            const query = this.serializeParams(params);
+            this.batchQueue.push({
+                request: {
+                    id      : this.batchQueue.length,
+                    method  : method.toUpperCase(),
+                    path    : query ? `${endpoint}${endpoint.includes('?') ? '&' : '?'}${query}` : endpoint,
+                    body    : data,
+                    headers,
+                },
+                resolve,
+                reject,
+            });
+            if (this.batchQueue.length === 1) {
+                queueMicrotask(() => this.flushBatch());
+            }
+        });
+    }
+
+    async flushBatch() {
+        const queue = this.batchQueue.splice(0, this.batchQueue.length);
+        for (let start = 0; start < queue.length; start += this.config.batchMaxSize) {
+            this.sendBatch(queue.slice(start, start + this.config.batchMaxSize));
+        }
+    }
+
+    async sendBatch(entries) {
+        // A single call is not worth the envelope
+        if (entries.length === 1) {
+            const { request, resolve, reject } = entries[0];
+            return this.apiClient({ method: request.method, url: request.path, data: request.body, headers: request.headers })
+                .then(response => resolve(response.data), reject);
+        }
+
+        const requests      = entries.map(({ request }, index) => ({ ...request, id: index }));
+        const concurrent    = requests.every(request => ['GET', 'HEAD', 'OPTIONS'].includes(request.method));
+        try {
+            const response = await this.apiClient.post(this.config.batchEndpoint, { requests, concurrent });
+            response.data.responses.forEach((result, index) => {
+                const { resolve, reject } = entries[index];
+                if (result.status >= 200 && result.status < 400) {
+                    resolve(result.body);
+                } else {
+                    // Same shape as an axios error so callers handle both alike
+                    const error     = new Error(`Request failed with status code ${result.status}`);
+                    error.response  = { status: result.status, data: result.body, headers: result.headers };
+                    reject(error);
+                }
+            });
+        } catch (error) {
+            entries.forEach(({ reject }) => reject(error));
+        }
+    }
+
     // Specific methods for different HTTP verbs
     get(endpoint, params = {}, headers = {}) {
-        return this.makeRequest('get', endpoint, null, { ...headers, params });
+        return this.makeRequest('get', endpoint, null, headers, params);
     }
 
     post(endpoint, data, headers = {}) {
@@ -96,6 +166,60 @@ class APIBase {
         return this.makeRequest('delete', endpoint, null, headers);
     }
 
+    // SHA-256 hex digest of a Blob, used to verify uploaded chunks on the server
+    async sha256(blob) {
+        const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+        return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    // Resumable chunked upload into FileMaster
+    // Pass the uploadId of an interrupted upload to send only the chunks the server is missing
+    async uploadFile(file, { name, uploadId, onProgress, endpoint = '/api/uploads/' } = {}) {
+        let session;
+        if (uploadId) {
+            session = await this.get(`${endpoint}${uploadId}/`);
+        } else {
+            session = await this.post(endpoint, {
+                filename    : file.name,
+                name        : name || file.name,
+                size        : file.size,
+                chunk_size  : this.config.uploadChunkSize,
+            });
+        }
+
+        const received  = new Set(session.received);
+        const pending   = [];
+        for (let index = 0; index < session.total_chunks; index++) {
+            if (!received.has(index)) pending.push(index);
+        }
+
+        // A few workers pull chunk indexes from the shared queue
+        const uploadChunk = async (index) => {
+            const chunk = file.slice(index * session.chunk_size, Math.min(file.size, (index + 1) * session.chunk_size));
+            for (let attempt = 1; ; attempt++) {
+                try {
+                    await this.apiClient.put(`${endpoint}${session.id}/chunks/${index}/`, chunk, {
+                        headers: { 'Content-Type': 'application/octet-stream', 'X-Chunk-Checksum': await this.sha256(chunk) },
+                        timeout: 0,
+                    });
+                    break;
+                } catch (error) {
+                    if (attempt >= this.config.retryLimit) throw error;
+                }
+            }
+            received.add(index);
+            if (onProgress) onProgress({ uploadId: session.id, done: received.size, total: session.total_chunks });
+        };
+        const worker = async () => {
+            while (pending.length) {
+                await uploadChunk(pending.shift());
+            }
+        };
+        await Promise.all(Array.from({ length: Math.min(this.config.uploadParallel, pending.length) }, worker));
+
+        return this.post(`${endpoint}${session.id}/complete/`);
+    }
+
     // Methods for token management in local storage
     getToken() {
         return localStorage.getItem(this.config.tokenKey);
@@ -0,0 +1,169 @@
+import functools
+import uuid
+from concurrent.futures         import ThreadPoolExecutor
+
+from django.apps                import apps
+from django.conf                import settings
+from django.contrib.auth        import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache          import caches
+from django.db                  import connection, transaction
+from django.http                import HttpRequest
+from django.utils               import timezone
+
+# Django Tenants
+from django_tenants.utils       import get_tenant_model, tenant_context
+
+from web                        import caching, response_cache
+from web.permissions            import object_permissions_changed
+
+
+# Admin action tuning, override in settings
+# ADMIN_ACTION_PROGRESS_CACHE_ALIAS: must be shared by every worker, the progress poll may reach
+# another process than the one running the job (check web.E002)
+ACTION_CHUNK_SIZE               =   getattr(settings, 'ADMIN_ACTION_CHUNK_SIZE', 500)
+ACTION_BACKGROUND_THRESHOLD     =   getattr(settings, 'ADMIN_ACTION_BACKGROUND_THRESHOLD', 5000)
+ACTION_BACKGROUND_WORKERS       =   getattr(settings, 'ADMIN_ACTION_BACKGROUND_WORKERS', 2)
+ACTION_PROGRESS_CACHE_ALIAS     =   getattr(settings, 'ADMIN_ACTION_PROGRESS_CACHE_ALIAS', 'default')
+ACTION_PROGRESS_TIMEOUT         =   60 * 60 * 24
+
+_executor = ThreadPoolExecutor(max_workers=ACTION_BACKGROUND_WORKERS, thread_name_prefix='admin-action')
+
+
+def progress_key(job_id):
+    return f'admin-action-progress:{job_id}'
+
+
+def get_progress(job_id):
+    return caches[ACTION_PROGRESS_CACHE_ALIAS].get(progress_key(job_id))
+
+
+def report(job_id, **progress):
+    cache = caches[ACTION_PROGRESS_CACHE_ALIAS]
+    state = cache.get(progress_key(job_id)) or {}
+    state.update(progress)
+    cache.set(progress_key(job_id), state, ACTION_PROGRESS_TIMEOUT)
+
+
+def chunks(pks, size):
+    for start in range(0, len(pks), size):
+        yield start, pks[start:start + size]
+
+
+def rows_updated(model, pks, values):
+    '''
+    What post_save would have set off for rows written with QuerySet.update().
+    '''
+    if 'has_object_permission' in values:
+        # Its receivers drop the request grant cache and bump the API table version
+        object_permissions_changed.send(sender=model, user_ids=None, content_type_id=ContentType.objects.get_for_model(model).pk, object_ids=pks)
+    else:
+        caching.on_commit(lambda: response_cache.bump(model))
+
+
+def run_job(job_id, schema_name, model_label, pks, user_id, handler):
+    '''
+    Background half of ActionExecutor.run(). Gets plain values only, the request that queued
+    the job is finished by now: the tenant and the user are loaded again on this thread's connection.
+    '''
+    # Progress keys of the tenant that polls them, this thread's connection starts on public
+    with caching.tenant_schema(schema_name):
+        try:
+            tenant = get_tenant_model().objects.get(schema_name=schema_name)
+            with tenant_context(tenant):
+                report(job_id, status='running', started_at=timezone.now().isoformat())
+
+                # Stands in for the request in model actions, see ActionExecutor.for_each
+                request         =   HttpRequest()
+                request.tenant  =   tenant
+                request.user    =   get_user_model()._default_manager.filter(pk=user_id).first() if user_id else None
+
+                handler(apps.get_model(model_label), pks, request, lambda done: report(job_id, done=done))
+                report(job_id, status='done', finished_at=timezone.now().isoformat())
+        except Exception as e:
+            report(job_id, status='failed', error=str(e))
+        finally:
+            connection.close()
+
+
+class ActionExecutor:
+    '''
+    Runs an admin action over a queryset in chunks of primary keys.
+    Selections larger than background_threshold are handed to a worker thread,
+    their progress can be polled with get_progress(job_id).
+    '''
+
+    def __init__(self, modeladmin, request, queryset, chunk_size=None, background_threshold=None):
+        self.model                  =   modeladmin.model
+        self.request                =   request
+        self.queryset               =   queryset
+        self.chunk_size             =   ACTION_CHUNK_SIZE if chunk_size is None else chunk_size
+        self.background_threshold   =   ACTION_BACKGROUND_THRESHOLD if background_threshold is None else background_threshold
+        self.schema_name            =   connection.schema_name
+        self.user_id                =   request.user.pk if request.user.is_authenticated else None
+
+    def run(self, name, handler, pks):
+        '''
+        Call handler(model, pks, request, report) inline or in the background.
+        The handler must not hold on to the request or the queryset, the job outlives them.
+        Returns the job id when the action was deferred, otherwise None.
+        '''
+        if len(pks) <= self.background_threshold:
+            handler(self.model, pks, self.request, lambda done: None)
+            return None
+
+        job_id = uuid.uuid4().hex
+        report(job_id, action=name, model=self.model._meta.label, status='queued', total=len(pks), done=0, error=None)
+        # Only after commit, the job must see what this request wrote
+        transaction.on_commit(functools.partial(_executor.submit, run_job, job_id, self.schema_name, self.model._meta.label, pks, self.user_id, handler))
+        return job_id
+
+    def selected_pks(self):
+        # Captured first so updating the filtered column does not shrink the selection
+        return list(self.queryset.values_list('pk', flat=True))
+
+    # Set based update
+    def update(self, name, **values):
+        '''
+        queryset.update() per chunk of primary keys, with one bulk insert of history rows per chunk.
+        update() sends no post_save, rows_updated() invalidates in its place.
+        '''
+        chunk_size = self.chunk_size
+        if any(field.name == 'updated_at' for field in self.model._meta.fields):
+            values.setdefault('updated_at', timezone.now())
+
+        def handler(model, pks, request, report):
+            history =   getattr(model, 'history', None)
+            user    =   request.user if getattr(request.user, 'is_authenticated', False) else None
+            for start, chunk in chunks(pks, chunk_size):
+                with transaction.atomic():
+                    model._default_manager.filter(pk__in=chunk).update(**values)
+                    if history is not None:
+                        history.bulk_history_create(
+                            list(model._default_manager.filter(pk__in=chunk)),
+                            update          =   True,
+                            default_user    =   user,
+                            default_date    =   values.get('updated_at'),
+                        )
+                    rows_updated(model, chunk, values)
+                report(start + len(chunk))
+
+        return self.run(name, handler, self.selected_pks())
+
+    # Per object
+    def for_each(self, name, func):
+        '''
+        Load the selection chunk by chunk, in the queryset's order, and call func(obj, request) on every row.
+        In the background `request` is a bare HttpRequest carrying the user and the tenant.
+        '''
+        chunk_size = self.chunk_size
+
+        def handler(model, pks, request, report):
+            for start, chunk in chunks(pks, chunk_size):
+                objects = model._default_manager.in_bulk(chunk)
+                for pk in chunk:
+                    if pk in objects:
+                        func(objects[pk], request)
+                report(start + len(chunk))
+
+        return self.run(name, handler, self.selected_pks())
@@ -8,20 +8,133 @@ from web.models             import *
 
 # Json Widget
 from .widget                import JsonEditorWidget
+from web                    import json_schema
+
+# Chunked action execution
+from .actions               import ActionExecutor, get_progress
+from django.contrib         import messages
+from django.http            import JsonResponse, Http404
+from django.urls            import path
+
+# Precomputed admin meta
+from types                  import MappingProxyType
+from typing                 import NamedTuple
+
+# Changelist query budget
+from django.conf                    import settings
+from django.core.exceptions         import FieldDoesNotExist
+from django.db                      import connection
 
 
 admin.site.site_header = "Equisy Developer's Admin"
 
 
-exempt                  =   []
+# Not registered: TenantSession rows of every tenant share the public table
+exempt                  =   ['tenantsession']
+
+# Fail changelist requests that run more queries than this (debug/test only, None disables)
+# admin_meta['changelist_query_budget'] overrides it per model
+ADMIN_CHANGELIST_QUERY_BUDGET   =   getattr(settings, 'ADMIN_CHANGELIST_QUERY_BUDGET', None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+# Admin meta computed once per model
+class AdminMeta(NamedTuple):
+    admin_meta          :   MappingProxyType
+    fieldsets           :   tuple
+    readonly_fields     :   tuple
+    json_schemas        :   MappingProxyType    # JSONField name -> schema JSON text for JsonEditorWidget
+    select_related      :   tuple               # Foreign keys shown in list_display
+    prefetch_related    :   tuple               # To-many relations shown in list_display, then admin_meta['list_prefetch_related']
+    list_display        :   tuple               # admin_meta['list_display'], to-many relations as columns reading the prefetch
+
+
+_admin_meta_cache = {}
+
+def related_column(accessor, description):
+    '''
+    list_display column listing the related objects of a to-many relation, from the prefetched rows.
+    '''
+    @admin.display(description=description)
+    def column(obj):
+        return ', '.join(str(related) for related in getattr(obj, accessor).all())
+    column.__name__ = accessor
+    return column
+
+def list_relations(model, list_display):
+    '''
+    (select_related, prefetch_related, list_display) for the relations shown in list_display.
+    Foreign keys are joined: Django's own fallback, select_related() without arguments, skips
+    nullable keys such as created_by/updated_by. Many to many and reverse relations, which the admin
+    cannot show itself, are prefetched and become columns listing the related objects.
+    '''
+    select_related, prefetch_related, columns = [], [], []
+    for name in list_display:
+        columns.append(name)
+        if not isinstance(name, str):
+            continue
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            continue
+        if field.concrete and (field.many_to_one or field.one_to_one):
+            select_related.append(name)
+        elif field.many_to_many or field.one_to_many:
+            accessor    =   field.name if field.concrete else field.get_accessor_name()
+            description =   field.verbose_name if field.concrete else field.related_model._meta.verbose_name_plural
+            prefetch_related.append(accessor)
+            columns[-1] =   related_column(accessor, description)
+    return tuple(select_related), tuple(prefetch_related), tuple(columns)
+
+def build_admin_meta(model):
+    '''
+    Merge common_admin_meta into admin_meta and derive the fieldsets, readonly fields
+    and JSON widget schemas. The model class itself is left untouched.
+    '''
+    common_admin_meta   =   getattr(model, 'common_admin_meta', {})
+    admin_meta          =   {**common_admin_meta, **getattr(model, 'admin_meta', {})}
+
+    common_fields       =   tuple(field.name for field in CommonModel._meta.fields if field.editable)
+    other_fields        =   tuple(field.name for field in model._meta.fields if (field.name not in common_fields and field.editable and field.name != 'id'))
+    fieldsets           =   (
+        (model._meta.object_name, MappingProxyType({'fields': other_fields})),
+        ('Meta Data', MappingProxyType({'fields': common_fields})),
+    )
+    readonly_fields     =   tuple(field.name for field in model._meta.fields if (not field.editable or field.name == 'id'))
+
+    json_schemas        =   {
+        name: json_schema.schema_text(config['schema'])
+        for name, config in admin_meta.get('json_fields', {}).items() if config.get('schema')
+    }
+
+    select_related, prefetch_related, list_display = list_relations(model, admin_meta.get('list_display', ()))
+
+    return AdminMeta(
+        admin_meta          =   MappingProxyType(admin_meta),
+        fieldsets           =   fieldsets,
+        readonly_fields     =   readonly_fields,
+        json_schemas        =   MappingProxyType(json_schemas),
+        select_related      =   select_related,
+        prefetch_related    =   tuple(dict.fromkeys((*prefetch_related, *admin_meta.get('list_prefetch_related', ())))),
+        list_display        =   list_display,
+    )
+
+def get_admin_meta(model):
+    if model not in _admin_meta_cache:
+        _admin_meta_cache[model] = build_admin_meta(model)
+    return _admin_meta_cache[model]
+
+
 class GenericAdmin(admin.ModelAdmin):
     
     # Common actions for all models
     @admin.action
     def bypass_permissions(self, request, queryset):
-        for obj in queryset:
-            obj.has_object_permission = False
-            obj.save()
+        job_id = self.get_action_executor(request, queryset).update('bypass_permissions', has_object_permission=False)
+        self.message_action_deferred(request, job_id)
             
     # Common actions for all models
     actions = ['bypass_permissions']
@@ -29,29 +142,38 @@ class GenericAdmin(admin.ModelAdmin):
     def __init__(self, model, admin_site):
         '''
         Dynamic admin meta from common model
-        adding common admin meta into the model admin meta
+        The merged admin meta (common + model) is built once per model by get_admin_meta
         We have done this so that the common admin meta does not get overwritten in the child class
         '''
         self.model          =   model
-        common_admin_meta   =   model.common_admin_meta if hasattr(model, 'common_admin_meta') else {}
-        model.admin_meta    =   {**common_admin_meta, **model.admin_meta} if hasattr(model, 'admin_meta') else common_admin_meta
+        self.meta           =   get_admin_meta(model)
+        admin_meta          =   self.meta.admin_meta
+
+        # Actions are added per admin, do not append to the list shared by every GenericAdmin
+        self.actions        =   list(self.actions)
 
         # Dynamic admin meta from model
         # Specify a static dictionary in model
         try:
             # Admin Meta
-            if model.admin_meta:
-                for k,v in model.admin_meta.items():
+            if admin_meta:
+                for k,v in admin_meta.items():
                     if k != 'actions': # Actions are handled separately
                         self.__setattr__(k,v)
         except:
             pass
+
+        # Query planning for the changelist, admin_meta['list_select_related'] takes precedence
+        if 'list_select_related' not in admin_meta and self.meta.select_related:
+            self.list_select_related = self.meta.select_related
+        if self.meta.list_display:
+            self.list_display = self.meta.list_display
         
         # Dynamic Actions from model
         # Specify a key 'actions' in the admin_meta dictionary in model
         try:
-            if 'actions' in model.admin_meta:
-                for action_name in model.admin_meta['actions']:
+            if 'actions' in admin_meta:
+                for action_name in admin_meta['actions']:
                     # Ensure action_name is a string
                     if isinstance(action_name, str):
                         action_function = getattr(self.model, action_name, None)
@@ -67,51 +189,94 @@ class GenericAdmin(admin.ModelAdmin):
     def formfield_for_dbfield(self, db_field, request, **kwargs):
         # Check if the field is a JSONField
         if isinstance(db_field, models.JSONField):
-            # Retrieve the schema configuration for JSON fields
-            json_fields_meta = self.model.admin_meta.get('json_fields', {})
-
-            # Retrieve the schema for the specific field, if defined
-            json_schema = json_fields_meta.get(db_field.name, {}).get('schema')
+            # Retrieve the schema for the specific field, if defined in admin_meta['json_fields']
+            schema = self.meta.json_schemas.get(db_field.name)
 
-            if json_schema:
+            if schema:
                 # Initialize the custom widget with the specified schema
-                kwargs['widget'] = JsonEditorWidget(schema=json_schema)
+                kwargs['widget'] = JsonEditorWidget(schema=schema)
             else:
                 # Else load the django-jsoneditor widget 
                 kwargs['widget'] = JSONEditor()
 
+            # The schema is enforced on the server by CommonModel.clean(), the editor only checks in the browser
+            return super().formfield_for_dbfield(db_field, request, **kwargs)
+
         return super().formfield_for_dbfield(db_field, request, **kwargs)
 
-    def get_fieldsets(self, request, obj=None):
-        # Define the fieldsets
-        common_fields   =   [field.name for field in CommonModel._meta.fields if field.editable]
-        other_fields    =   [field.name for field in self.model._meta.fields if (field.name not in common_fields and field.editable and field.name != 'id')]
-
-        fieldsets = [
-            (self.model._meta.object_name, {
-                'fields': other_fields,
-            }),
-            ('Meta Data', {
-                'fields': common_fields,
-            }),
-        ]
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if self.meta.prefetch_related:
+            queryset = queryset.prefetch_related(*self.meta.prefetch_related)
+        return queryset
+
+    def changelist_view(self, request, extra_context=None):
+        budget = getattr(self, 'changelist_query_budget', ADMIN_CHANGELIST_QUERY_BUDGET)
+        if not budget:
+            return super().changelist_view(request, extra_context)
+
+        # django.test is only imported when a budget is set
+        from django.test.utils import CaptureQueriesContext
+
+        with CaptureQueriesContext(connection) as queries:
+            response = super().changelist_view(request, extra_context)
+            # Most queries of a changelist run while the template renders
+            if hasattr(response, 'render'):
+                response.render()
+
+        if len(queries) > budget:
+            raise QueryBudgetExceeded(
+                f'{self.model.__name__} changelist ran {len(queries)} queries, budget is {budget}:\n'
+                + '\n'.join(query['sql'] for query in queries.captured_queries)
+            )
+        return response
 
-        return fieldsets
+    def get_fieldsets(self, request, obj=None):
+        # Model specific fields first, then the CommonModel fields as 'Meta Data'
+        return self.meta.fieldsets
     
     def get_readonly_fields(self, request, obj=None):
-        # Get a list of non-editable fields
-        readonly_fields = [field.name for field in self.model._meta.fields if (not field.editable or field.name == 'id')]
-
-        return readonly_fields
+        # Non-editable fields and the id
+        return self.meta.readonly_fields
     
+    # Chunked action execution
+    # admin_meta can set 'action_chunk_size' and 'action_background_threshold' per model
+    def get_action_executor(self, request, queryset):
+        return ActionExecutor(
+            self, request, queryset,
+            chunk_size              =   getattr(self, 'action_chunk_size', None),
+            background_threshold    =   getattr(self, 'action_background_threshold', None),
+        )
+
+    def message_action_deferred(self, request, job_id):
+        if job_id:
+            progress_url = f'{request.path}action-progress/{job_id}/'
+            self.message_user(request, f'The action is running in the background. Progress: {progress_url}', messages.INFO)
+
+    def action_progress_view(self, request, job_id):
+        progress = get_progress(job_id)
+        if progress is None or progress.get('model') != self.model._meta.label:
+            raise Http404
+        return JsonResponse(progress)
+
+    def get_urls(self):
+        urls = [
+            path('action-progress/<str:job_id>/', self.admin_site.admin_view(self.action_progress_view), name=f'{self.model._meta.app_label}_{self.model._meta.model_name}_action_progress'),
+        ]
+        return urls + super().get_urls()
+
     # Function to add actions to the admin class
     def add_action(self, action_function, action_name):
         def wrapper_action(modeladmin, request, queryset):
-            for obj in queryset:
+            # Called in the background with a bare request carrying the user and tenant, see ActionExecutor.for_each
+            def run(obj, request):
                 action_method = getattr(obj, action_name)
                 if callable(action_method):
                     action_method(obj, request)
 
+            job_id = modeladmin.get_action_executor(request, queryset).for_each(action_name, run)
+            modeladmin.message_action_deferred(request, job_id)
+
         unique_action_name                  = f'admin_action_{self.model.__name__}_{action_name}'
         wrapper_action.__name__             = unique_action_name
         wrapper_action.short_description    = action_name.replace('_', ' ').title()
@@ -119,10 +284,11 @@ class GenericAdmin(admin.ModelAdmin):
         if unique_action_name not in [action for action in self.actions]:
             self.actions.append(wrapper_action)
             print(f'Added action {unique_action_name} to {self.model.__name__}')
-            
+
     # Custom Media so that we can add custom js files
+    # $/jQuery come from the admin's own jQuery instead of a second copy from a CDN
     class Media:
-        js = ('https://code.jquery.com/jquery-3.7.0.js', )
+        js = ('admin/js/jquery.init.js', 'web/jquery_global.js', )
 
 
 
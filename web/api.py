@@ -0,0 +1,202 @@
+import hashlib
+
+from django.conf                    import settings
+from django.contrib                 import admin
+from django.contrib.auth            import get_user_model
+from django.core.exceptions         import ValidationError as DjangoValidationError
+from django.db.models               import Count, Max
+from django.http                    import HttpResponseNotModified
+from django.utils.http              import http_date, parse_http_date_safe, quote_etag, parse_etags
+
+# Django Rest Framework
+from rest_framework                 import serializers, viewsets, permissions, routers
+from rest_framework.exceptions      import ValidationError
+from rest_framework.pagination      import CursorPagination
+from rest_framework.response        import Response
+
+from web                            import response_cache
+from web.admin                      import GenericAdmin
+from web.models                     import CommonModel
+
+
+# REST API settings, override in settings
+API_PAGE_SIZE           =   getattr(settings, 'API_PAGE_SIZE', 50)
+API_MAX_PAGE_SIZE       =   getattr(settings, 'API_MAX_PAGE_SIZE', 500)
+
+# CommonModel relations rendered inline, joined with select_related instead of one query per row
+USER_RELATIONS          =   ('created_by', 'updated_by')
+USER_FIELDS             =   ('id', 'email')
+
+# Model properties serialized when the model has them, with the columns they read
+URL_PROPERTIES          =   {
+    'media_url'         :   (),
+    'thumbnail_url'     :   ('image', 'renditions'),
+}
+
+
+class KeysetPagination(CursorPagination):
+    '''
+    WHERE id < last seen id instead of OFFSET, pages cost the same however deep the client goes.
+    '''
+    ordering                =   '-pk'
+    page_size               =   API_PAGE_SIZE
+    page_size_query_param   =   'page_size'
+    max_page_size           =   API_MAX_PAGE_SIZE
+
+
+class ModelPermissions(permissions.DjangoModelPermissions):
+    # Reads need the view permission too
+    perms_map = {**permissions.DjangoModelPermissions.perms_map, 'GET': ['%(app_label)s.view_%(model_name)s']}
+
+
+class UserSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model   =   get_user_model()
+        fields  =   USER_FIELDS
+
+
+class CommonModelSerializer(serializers.ModelSerializer):
+    '''
+    Base for the generated serializers. `?fields=a,b` drops every other field,
+    CommonModelViewSet narrows the SELECT to the same columns.
+    '''
+    created_by  =   UserSummarySerializer(read_only=True)
+    updated_by  =   UserSummarySerializer(read_only=True)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = self.context.get('fields')
+        if requested:
+            for name in set(self.fields) - set(requested):
+                self.fields.pop(name)
+
+
+def serializer_for(model):
+    meta        =   type('Meta', (), {'model': model, 'fields': '__all__', 'read_only_fields': ('created_at', 'updated_at')})
+    properties  =   {name: serializers.ReadOnlyField() for name in URL_PROPERTIES if hasattr(model, name)}
+    return type(f'{model.__name__}Serializer', (CommonModelSerializer,), {'Meta': meta, **properties})
+
+
+class CommonModelViewSet(viewsets.ModelViewSet):
+    pagination_class    =   KeysetPagination
+    permission_classes  =   (permissions.IsAuthenticated, ModelPermissions)
+
+    # Object permission checked for each action, in SQL through CommonQuerySet.filter_permitted
+    action_permissions  =   {'update': 'change', 'partial_update': 'change', 'destroy': 'delete'}
+
+    def get_requested_fields(self):
+        if not hasattr(self, '_requested_fields'):
+            requested   =   [name for name in self.request.query_params.get('fields', '').split(',') if name] if self.request else []
+            available   =   set(self.get_serializer_class()().fields)
+            unknown     =   [name for name in requested if name not in available]
+            if unknown:
+                raise ValidationError({'fields': [f'Unknown field "{name}"' for name in unknown]})
+            self._requested_fields = requested
+        return self._requested_fields
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.action in ('list', 'retrieve'):
+            context['fields'] = self.get_requested_fields()
+        return context
+
+    def get_queryset(self):
+        model       =   self.queryset.model
+        codename    =   f'{self.action_permissions.get(self.action, "view")}_{model._meta.model_name}'
+        queryset    =   self.queryset.filter_permitted(self.request.user, codename)
+
+        # Only the columns that are serialized, the joined users included
+        concrete    =   [field.name for field in model._meta.concrete_fields]
+        requested   =   self.get_requested_fields() if self.action in ('list', 'retrieve') else []
+        columns     =   [name for name in (requested or concrete) if name in concrete]
+        columns     +=  [column for name in requested for column in URL_PROPERTIES.get(name, ()) if column not in columns]
+        relations   =   [name for name in USER_RELATIONS if name in columns]
+
+        return queryset.select_related(*relations).only(
+            'pk',
+            *(name for name in columns if name not in relations),
+            *(f'{relation}__{name}' for relation in relations for name in USER_FIELDS),
+        )
+
+    # Conditional reads
+    def read_validators(self):
+        '''
+        (etag, last_modified) from the table version counter, max(updated_at) and the row count
+        of what this user can see. Costs one aggregate query, nothing is serialized.
+        '''
+        queryset = self.filter_queryset(self.get_queryset()).order_by()
+        if self.action == 'retrieve':
+            lookup      =   self.lookup_url_kwarg or self.lookup_field
+            queryset    =   queryset.filter(**{self.lookup_field: self.kwargs[lookup]})
+
+        state   =   queryset.aggregate(last_modified=Max('updated_at'), count=Count('pk'))
+        version =   response_cache.table_version(self.queryset.model)
+        request =   self.request
+        digest  =   hashlib.md5(
+            f'{version}:{state["last_modified"]}:{state["count"]}:{request.user.pk}:{request.accepted_renderer.format}:{request.get_full_path()}'.encode()
+        ).hexdigest()
+        return quote_etag(digest), state['last_modified']
+
+    def conditional_read(self, read, request, *args, **kwargs):
+        etag, last_modified = self.read_validators()
+        last_modified       = int(last_modified.timestamp()) if last_modified else None
+
+        if_none_match       =   request.headers.get('If-None-Match')
+        if_modified_since   =   parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        if (if_none_match and etag in parse_etags(if_none_match)) or (
+            not if_none_match and if_modified_since and last_modified and last_modified <= if_modified_since
+        ):
+            response = HttpResponseNotModified()
+        else:
+            # The ETag covers everything the body depends on, so it doubles as the cache key
+            data = response_cache.get_response(etag)
+            if data is not None:
+                response = Response(data)
+            else:
+                response = read(request, *args, **kwargs)
+                if response.status_code == 200:
+                    response_cache.set_response(etag, response.data)
+
+        response['ETag']            =   etag
+        response['Cache-Control']   =   'private, no-cache'
+        if last_modified:
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_read(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_read(super().retrieve, request, *args, **kwargs)
+
+    # Writes
+    def save(self, serializer, **values):
+        # CommonModel.save() checks the JSONField schemas, its errors are the client's: 400, not 500
+        try:
+            serializer.save(**values)
+        except DjangoValidationError as e:
+            raise ValidationError(serializers.as_serializer_error(e))
+
+    def perform_create(self, serializer):
+        self.save(serializer, created_by=self.request.user, updated_by=self.request.user)
+
+    def perform_update(self, serializer):
+        self.save(serializer, updated_by=self.request.user)
+
+
+def viewset_for(model):
+    return type(f'{model.__name__}ViewSet', (CommonModelViewSet,), {
+        'queryset'          :   model.objects.all(),
+        'serializer_class'  :   serializer_for(model),
+    })
+
+
+def build_router(site=admin.site):
+    '''
+    One viewset per CommonModel that web/admin.py registered with GenericAdmin, at api/<model_name>/.
+    '''
+    router = routers.DefaultRouter()
+    for model, model_admin in site._registry.items():
+        if isinstance(model_admin, GenericAdmin) and issubclass(model, CommonModel):
+            router.register(model._meta.model_name, viewset_for(model), basename=model._meta.model_name)
+    return router
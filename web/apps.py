@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class WebConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'web'
+
+    def ready(self):
+        # Signal receivers
+        from web import tenant_cache, response_cache, permission_backend
+
+        # System checks
+        from web import caching
@@ -0,0 +1,262 @@
+'''
+Tenant namespaced cache keys.
+
+make_key is the KEY_FUNCTION of settings.CACHES: every key is prefixed with the active tenant schema and
+that tenant's generation, so the same key never reaches another tenant's entry and purge() drops all of
+one tenant's entries at once by moving its generation on. Keys starting with "global:" are shared by all tenants.
+'''
+import functools
+import hashlib
+import threading
+import time
+from contextlib                     import contextmanager
+from contextvars                    import ContextVar
+
+from django.conf                    import settings
+from django.core                    import checks
+from django.core.cache              import caches
+from django.db                      import connection, transaction
+
+
+# Tenant cache settings, override in settings
+# TENANT_CACHE_GENERATION_ALIAS: where the generation counters live, shared backends make purge() reach every process
+# TENANT_CACHE_GENERATION_TTL: seconds a process reuses a generation it read, 0 reads it on every cache call
+TENANT_CACHE_GENERATION_ALIAS   =   getattr(settings, 'TENANT_CACHE_GENERATION_ALIAS', 'default')
+TENANT_CACHE_GENERATION_TTL     =   getattr(settings, 'TENANT_CACHE_GENERATION_TTL', 1)
+TENANT_CACHE_LOCK_TIMEOUT       =   getattr(settings, 'TENANT_CACHE_LOCK_TIMEOUT', 10)
+
+GLOBAL_PREFIX                   =   'global:'
+KEY_FUNCTION                    =   'web.caching.make_key'
+
+# Backends whose entries only the process that wrote them sees
+PROCESS_LOCAL_BACKENDS          =   (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Schema the keys are built for when it is not the connection's, see tenant_schema()
+_schema                         =   ContextVar('tenant_cache_schema', default=None)
+
+# {schema: (generation, read at)}
+_generations                    =   {}
+_generations_lock               =   threading.Lock()
+
+
+def schema_name():
+    return _schema.get() or getattr(connection, 'schema_name', 'public')
+
+
+@contextmanager
+def tenant_schema(schema):
+    '''
+    Build keys for `schema` inside the block, e.g. in on_commit callbacks that may run on another tenant.
+    '''
+    token = _schema.set(schema)
+    try:
+        yield
+    finally:
+        _schema.reset(token)
+
+
+def on_commit(func):
+    '''
+    transaction.on_commit(func), with func building its keys for the tenant active now.
+    '''
+    schema = schema_name()
+
+    def run():
+        with tenant_schema(schema):
+            func()
+    transaction.on_commit(run)
+
+
+def is_shared(alias):
+    '''
+    Whether every worker process reads and writes the same entries through CACHES[alias].
+    '''
+    return settings.CACHES.get(alias, {}).get('BACKEND') not in PROCESS_LOCAL_BACKENDS
+
+
+def generation_key(schema):
+    return f'{GLOBAL_PREFIX}tenant-generation:{schema}'
+
+
+def generation(schema):
+    if TENANT_CACHE_GENERATION_TTL:
+        memo = _generations.get(schema)
+        if memo is not None and memo[1] + TENANT_CACHE_GENERATION_TTL > time.monotonic():
+            return memo[0]
+
+    # Starts from the clock, so a counter dropped by the cache never brings old entries back
+    cache = caches[TENANT_CACHE_GENERATION_ALIAS]
+    value = cache.get(generation_key(schema))
+    if value is None:
+        cache.add(generation_key(schema), time.time_ns(), timeout=None)
+        value = cache.get(generation_key(schema))
+
+    with _generations_lock:
+        _generations[schema] = (value, time.monotonic())
+    return value
+
+
+def purge(schema=None):
+    '''
+    Orphans every cache entry of `schema` (default the active tenant), whatever its key.
+    The entries are not deleted, the backend evicts or expires them.
+    '''
+    schema  =   schema or schema_name()
+    cache   =   caches[TENANT_CACHE_GENERATION_ALIAS]
+    try:
+        value = cache.incr(generation_key(schema))
+    except ValueError:
+        value = time.time_ns()
+        cache.set(generation_key(schema), value, timeout=None)
+
+    with _generations_lock:
+        _generations[schema] = (value, time.monotonic())
+
+
+def make_key(key, key_prefix, version):
+    if key.startswith(GLOBAL_PREFIX):
+        return f'{key_prefix}:{version}:{key}'
+    schema = schema_name()
+    return f'{key_prefix}:{version}:{schema}:{generation(schema)}:{key}'
+
+
+# Decorator
+def call_key(func, args, kwargs):
+    arguments = hashlib.md5(repr((args, sorted(kwargs.items()))).encode()).hexdigest()
+    return f'tenant-cached:{func.__module__}.{func.__qualname__}:{arguments}'
+
+
+def tenant_cached(timeout=300, stale=None, alias='default', lock_timeout=TENANT_CACHE_LOCK_TIMEOUT):
+    '''
+    Caches the result of the decorated function per tenant and arguments (their repr).
+
+    Stampede protection: one caller recomputes an entry, the others meanwhile
+    - get the previous value for up to `stale` seconds (default `timeout`) after it went out of date,
+    - or, when there is none, wait for the recomputed one (up to `lock_timeout` seconds).
+    Threads of one process share a lock per key, processes share a cache.add() lock.
+
+    func.invalidate(*args, **kwargs) drops one entry.
+    '''
+    stale = timeout if stale is None else stale
+
+    def decorator(func):
+        # Striped, so the locks stay bounded however many argument combinations are cached
+        local_locks = [threading.Lock() for _ in range(64)]
+
+        def compute(cache, key, args, kwargs):
+            value = func(*args, **kwargs)
+            cache.set(key, (value, time.time() + timeout), timeout + stale)
+            return value
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache   =   caches[alias]
+            key     =   call_key(func, args, kwargs)
+            entry   =   cache.get(key)
+            if entry is not None and entry[1] > time.time():
+                return entry[0]
+
+            lock_key = f'{key}:lock'
+            with local_locks[hash(key) % len(local_locks)]:
+                # Another thread may have refreshed it while this one waited
+                entry = cache.get(key)
+                if entry is not None and entry[1] > time.time():
+                    return entry[0]
+
+                if cache.add(lock_key, 1, lock_timeout):
+                    try:
+                        return compute(cache, key, args, kwargs)
+                    finally:
+                        cache.delete(lock_key)
+
+                # Another process is recomputing
+                if entry is not None:
+                    return entry[0]
+                deadline = time.monotonic() + lock_timeout
+                while time.monotonic() < deadline:
+                    time.sleep(0.05)
+                    entry = cache.get(key)
+                    if entry is not None:
+                        return entry[0]
+                return compute(cache, key, args, kwargs)
+
+        def invalidate(*args, **kwargs):
+            caches[alias].delete(call_key(func, args, kwargs))
+
+        wrapper.invalidate = invalidate
+        return wrapper
+
+    return decorator
+
+
+# Checks
+def tenant_cache_aliases():
+    '''
+    {alias: [settings naming it]} of the caches holding tenant data.
+    '''
+    from web import permission_backend, response_cache, site_settings
+
+    used_by = {}
+    for setting, alias in (
+        ('SITE_SETTING_CACHE_ALIAS',    site_settings.SITE_SETTING_CACHE_ALIAS),
+        ('API_RESPONSE_CACHE_ALIAS',    response_cache.API_RESPONSE_CACHE_ALIAS),
+        ('PERMISSION_CACHE_ALIAS',      permission_backend.PERMISSION_CACHE_ALIAS),
+        ('SESSION_CACHE_ALIAS',         settings.SESSION_CACHE_ALIAS),
+    ):
+        used_by.setdefault(alias, []).append(setting)
+    return used_by
+
+
+@checks.register(checks.Tags.caches)
+def check_tenant_key_function(app_configs, **kwargs):
+    '''
+    The caches holding tenant data must build their keys with make_key.
+    '''
+    errors = []
+    for alias, names in tenant_cache_aliases().items():
+        key_function = settings.CACHES.get(alias, {}).get('KEY_FUNCTION')
+        if key_function not in (KEY_FUNCTION, make_key):
+            errors.append(checks.Error(
+                f'CACHES["{alias}"] ({", ".join(names)}) does not use {KEY_FUNCTION}, its keys are not namespaced by tenant.',
+                hint=f'Set "KEY_FUNCTION": "{KEY_FUNCTION}" on that cache.',
+                id='web.E001',
+            ))
+    return errors
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_caches(app_configs, **kwargs):
+    '''
+    Invalidations (purge(), generation and version bumps, tenant resolution, session writes) and admin action progress only
+    reach the process that wrote them when the cache is local to it, the other workers keep serving the old entries.
+    '''
+    from web import actions, tenant_cache
+
+    errors = []
+    if tenant_cache.TENANT_CACHE_SHARED_ALIAS is None:
+        errors.append(checks.Error(
+            'TENANT_CACHE_SHARED_ALIAS is None, Domain and Startup changes do not reach the other workers.',
+            hint='Point it at a shared cache, it defaults to "default".',
+            id='web.E002',
+        ))
+
+    used_by = tenant_cache_aliases()
+    for setting, alias in (
+        ('TENANT_CACHE_GENERATION_ALIAS',       TENANT_CACHE_GENERATION_ALIAS),
+        ('ADMIN_ACTION_PROGRESS_CACHE_ALIAS',   actions.ACTION_PROGRESS_CACHE_ALIAS),
+        ('TENANT_CACHE_SHARED_ALIAS',           tenant_cache.TENANT_CACHE_SHARED_ALIAS),
+    ):
+        if alias is not None:
+            used_by.setdefault(alias, []).append(setting)
+
+    return errors + [
+        checks.Error(
+            f'CACHES["{alias}"] ({", ".join(names)}) is local to each process, invalidations do not reach the other workers.',
+            hint='Use a shared backend such as django.core.cache.backends.redis.RedisCache (CACHE_BACKEND/CACHE_LOCATION).',
+            id='web.E002',
+        )
+        for alias, names in used_by.items() if not is_shared(alias)
+    ]
@@ -0,0 +1,154 @@
+import threading
+from concurrent.futures         import ThreadPoolExecutor
+
+from django.conf                import settings
+from django.db                  import connections, transaction
+from django.utils               import timezone
+
+# Simple History
+from simple_history.models      import HistoricalRecords
+from simple_history.signals     import pre_create_historical_record, post_create_historical_record
+
+
+# 'commit'   : collect history rows in the transaction and bulk insert them on commit
+# 'deferred' : same, but the insert is done by a local worker thread after commit
+# 'off'      : one INSERT per save, plain simple_history behaviour
+HISTORY_BUFFER_MODE             =   getattr(settings, 'HISTORY_BUFFER_MODE', 'commit')
+HISTORY_BUFFER_BATCH_SIZE       =   getattr(settings, 'HISTORY_BUFFER_BATCH_SIZE', 1000)
+HISTORY_DEFERRED_WORKERS        =   getattr(settings, 'HISTORY_DEFERRED_WORKERS', 1)
+
+_local      =   threading.local()
+_worker     =   ThreadPoolExecutor(max_workers=HISTORY_DEFERRED_WORKERS, thread_name_prefix='history-writer')
+
+
+class HistoryBatch:
+    '''
+    History rows written at one savepoint level of a transaction.
+    Its flush is registered with on_commit when the batch is created, so Django drops it
+    together with the rows if that savepoint (or the whole transaction) is rolled back.
+    '''
+
+    def __init__(self, records, using):
+        self.records        =   records
+        self.using          =   using
+        self.rows           =   []
+        connection          =   connections[using]
+        transaction.on_commit(self.flush, using=using)
+        self.callbacks      =   connection.run_on_commit
+
+    def is_pending(self):
+        # run_on_commit is replaced on commit, rollback and savepoint rollback; rescan only then
+        connection = connections[self.using]
+        if connection.run_on_commit is self.callbacks:
+            return True
+        if any(func == self.flush for _, func, _ in connection.run_on_commit):
+            self.callbacks = connection.run_on_commit
+            return True
+        return False
+
+    def flush(self):
+        batches = getattr(_local, 'batches', {})
+        for key, batch in list(batches.items()):
+            if batch is self:
+                del batches[key]
+
+        if not self.rows:
+            return
+        if HISTORY_BUFFER_MODE == 'deferred':
+            tenant = getattr(connections[self.using], 'tenant', None)
+            _worker.submit(_write_deferred, self.records, self.rows, self.using, tenant)
+        else:
+            self.records.write_rows(self.rows, self.using)
+
+
+def _write_deferred(records, rows, using, tenant):
+    connection = connections[using]
+    try:
+        if tenant is not None:
+            connection.set_tenant(tenant)
+        records.write_rows(rows, using)
+    finally:
+        connection.close()
+
+
+def get_batch(records, using):
+    connection  =   connections[using]
+    batches     =   _local.__dict__.setdefault('batches', {})
+    key         =   (using, tuple(connection.savepoint_ids))
+    batch       =   batches.get(key)
+
+    if batch is None or not batch.is_pending():
+        batch = batches[key] = HistoryBatch(records, using)
+    return batch
+
+
+class BufferedHistoricalRecords(HistoricalRecords):
+    '''
+    HistoricalRecords that does not INSERT the historical row on every save.
+    Inside a transaction the rows are collected and written with one bulk_create on commit,
+    outside of one (autocommit) it behaves exactly like HistoricalRecords.
+    '''
+
+    def create_historical_record(self, instance, history_type, using=None):
+        using = using if self.use_base_model_db else None
+        alias = using or 'default'
+
+        if HISTORY_BUFFER_MODE == 'off' or not connections[alias].in_atomic_block:
+            return super().create_historical_record(instance, history_type, using=using)
+
+        history_date            =   getattr(instance, '_history_date', timezone.now())
+        history_user            =   self.get_history_user(instance)
+        history_change_reason   =   self.get_change_reason_for_object(instance, history_type, using)
+        manager                 =   getattr(instance, self.manager_name)
+
+        attrs = {}
+        for field in self.fields_included(instance):
+            attrs[field.attname] = getattr(instance, field.attname)
+
+        relation_field = getattr(manager.model, 'history_relation', None)
+        if relation_field is not None:
+            attrs['history_relation'] = instance
+
+        history_instance = manager.model(
+            history_date            =   history_date,
+            history_type            =   history_type,
+            history_user            =   history_user,
+            history_change_reason   =   history_change_reason,
+            **attrs,
+        )
+
+        pre_create_historical_record.send(
+            sender                  =   manager.model,
+            instance                =   instance,
+            history_date            =   history_date,
+            history_user            =   history_user,
+            history_change_reason   =   history_change_reason,
+            history_instance        =   history_instance,
+            using                   =   using,
+        )
+
+        get_batch(self, alias).rows.append((instance, history_instance))
+
+    def write_rows(self, rows, using):
+        # One bulk_create per historical model
+        by_model = {}
+        for instance, history_instance in rows:
+            by_model.setdefault(type(history_instance), []).append((instance, history_instance))
+
+        for history_model, model_rows in by_model.items():
+            history_model._default_manager.using(using).bulk_create(
+                [history_instance for _, history_instance in model_rows],
+                batch_size = HISTORY_BUFFER_BATCH_SIZE,
+            )
+            for instance, history_instance in model_rows:
+                if history_instance._history_m2m_fields:
+                    self.create_historical_record_m2ms(history_instance, instance)
+                post_create_historical_record.send(
+                    sender                  =   history_model,
+                    instance                =   instance,
+                    history_instance        =   history_instance,
+                    history_date            =   history_instance.history_date,
+                    history_user            =   history_instance.history_user,
+                    history_change_reason   =   history_instance.history_change_reason,
+                    using                   =   using,
+                )
@@ -0,0 +1,92 @@
+import functools
+import json
+
+from django.core.exceptions         import ValidationError
+
+
+class CompiledSchema:
+    '''
+    fastjsonschema turns the schema into Python code, that is what runs on every save.
+    Only when it rejects a value does jsonschema walk it again to list every error.
+    '''
+
+    def __init__(self, schema):
+        # Imported on first compile instead of with web.models, both are slow to import
+        import fastjsonschema
+        from jsonschema import Draft7Validator
+
+        Draft7Validator.check_schema(schema)
+        # Formats are not checked, jsonschema skips them too without extra packages
+        self.check      =   fastjsonschema.compile(schema, use_default=False, use_formats=False)
+        self.invalid    =   fastjsonschema.JsonSchemaValueException
+        self.validator  =   Draft7Validator(schema)
+
+    def iter_errors(self, value):
+        try:
+            self.check(value)
+        except self.invalid:
+            yield from self.validator.iter_errors(value)
+
+
+def schema_text(schema):
+    # admin_meta['json_fields'][...]['schema'] may be a dict or its JSON text
+    return schema if isinstance(schema, str) else json.dumps(schema, sort_keys=True)
+
+
+@functools.lru_cache(maxsize=None)
+def compile_schema(text):
+    return CompiledSchema(json.loads(text))
+
+
+def get_validator(schema):
+    return compile_schema(schema_text(schema))
+
+
+@functools.lru_cache(maxsize=None)
+def model_validators(model):
+    '''
+    {field name: compiled validator} for the json_fields of a model's (common_)admin_meta, built once per model.
+    '''
+    admin_meta  =   {**getattr(model, 'common_admin_meta', {}), **getattr(model, 'admin_meta', {})}
+    return {
+        name: get_validator(config['schema'])
+        for name, config in admin_meta.get('json_fields', {}).items() if config.get('schema')
+    }
+
+
+def errors(validator, value):
+    '''
+    Structured schema errors: [{'path': '$.navMenu[0].id', 'message': ..., 'keyword': 'type'}, ...]
+    '''
+    return sorted(
+        ({'path': error.json_path, 'message': error.message, 'keyword': error.validator} for error in validator.iter_errors(value)),
+        key=lambda error: error['path'],
+    )
+
+
+def as_validation_error(field_errors):
+    return [
+        ValidationError('%(path)s: %(message)s', params=error, code=f'schema_{error["keyword"]}')
+        for error in field_errors
+    ]
+
+
+def validate_instance(instance, fields=None):
+    '''
+    Check the JSONFields of `instance` against their schemas.
+    Raises ValidationError({field: [...]}) with every violation of every field.
+    '''
+    found = {}
+    for name, validator in model_validators(type(instance)).items():
+        if fields is not None and name not in fields:
+            continue
+        value = getattr(instance, name)
+        if value is None:
+            continue
+        field_errors = errors(validator, value)
+        if field_errors:
+            found[name] = as_validation_error(field_errors)
+
+    if found:
+        raise ValidationError(found)
+
@@ -0,0 +1,97 @@
+import json
+import time
+
+import jsonschema
+
+from django.core.management.base    import BaseCommand
+from django.db                      import transaction
+
+from web                            import json_schema
+from web.models                     import SiteSetting
+
+
+# Schema used for the extra_params payload, CommonModel.extra_params has none of its own
+EXTRA_PARAMS_SCHEMA = {
+    "type": "object",
+    "additionalProperties": {
+        "type": "object",
+        "properties": {
+            "value"     :   {"type": ["string", "number", "boolean", "null"]},
+            "tags"      :   {"type": "array", "items": {"type": "string"}},
+        },
+        "required": ["value"],
+    },
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+def navigation_menu(items, fanout):
+    # Roughly `items` menu items, `fanout` children per node
+    counter = iter(range(items))
+
+    def nodes(depth):
+        result = []
+        for _ in range(fanout):
+            index = next(counter, None)
+            if index is None:
+                break
+            node = {'id': f'item-{index}', 'label': f'Item {index}', 'url': f'/page/{index}'}
+            if depth < 3:
+                node['children'] = nodes(depth + 1)
+            result.append(node)
+        return result
+
+    menu = []
+    while True:
+        level = nodes(0)
+        if not level:
+            break
+        menu += level
+    return {'navMenu': menu}
+
+
+class Command(BaseCommand):
+    help = 'Measure JSON schema validation per save: compiled validators vs jsonschema.validate(). The saves are rolled back.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items',      type=int, default=5000, help='Items in the payloads')
+        parser.add_argument('--fanout',     type=int, default=10,   help='Children per navigation menu item')
+        parser.add_argument('--runs',       type=int, default=20,   help='Repetitions per measurement')
+
+    def measure(self, label, func, runs):
+        start = time.perf_counter()
+        for _ in range(runs):
+            func()
+        self.stdout.write(f'{label:<40} {(time.perf_counter() - start) / runs * 1000:8.2f} ms')
+
+    def handle(self, *args, **options):
+        runs            =   options['runs']
+        menu            =   navigation_menu(options['items'], options['fanout'])
+        extra_params    =   {f'key-{i}': {'value': i, 'tags': ['a', 'b']} for i in range(options['items'])}
+        menu_schema     =   SiteSetting.admin_meta['json_fields']['navigation_menu']['schema']
+
+        self.stdout.write(f'navigation_menu {len(json.dumps(menu)) / 1024:.0f} KB, extra_params {len(json.dumps(extra_params)) / 1024:.0f} KB')
+
+        json_schema.compile_schema.cache_clear()
+        start = time.perf_counter()
+        json_schema.get_validator(menu_schema)
+        self.stdout.write(f'{"compile navigation_menu schema (once)":<40} {(time.perf_counter() - start) * 1000:8.2f} ms')
+
+        self.measure('navigation_menu, jsonschema.validate()', lambda: jsonschema.validate(menu, menu_schema), runs)
+        self.measure('navigation_menu, compiled', lambda: json_schema.errors(json_schema.get_validator(menu_schema), menu), runs)
+        self.measure('extra_params, jsonschema.validate()', lambda: jsonschema.validate(extra_params, EXTRA_PARAMS_SCHEMA), runs)
+        self.measure('extra_params, compiled', lambda: json_schema.errors(json_schema.get_validator(EXTRA_PARAMS_SCHEMA), extra_params), runs)
+
+        setting = SiteSetting(navigation_menu=menu, extra_params=extra_params)
+        self.measure('SiteSetting.clean_json_fields()', setting.clean_json_fields, runs)
+
+        try:
+            with transaction.atomic():
+                setting.save()
+                self.measure('SiteSetting.save()', setting.save, runs)
+                raise Rollback
+        except Rollback:
+            pass
@@ -0,0 +1,72 @@
+import random
+import time
+
+from django.contrib.auth                import get_user_model
+from django.contrib.auth.models         import Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base        import BaseCommand
+from django.db                          import transaction
+
+from web.models                         import ImageMaster, ObjectPermission
+from web.permissions                    import permission_grants
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Measure ObjectPermission bulk insert and lookup throughput. Everything is rolled back at the end.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users',      type=int, default=100,   help='Number of users to grant to')
+        parser.add_argument('--objects',    type=int, default=10000, help='Number of object ids per user (grants = users x objects)')
+        parser.add_argument('--lookups',    type=int, default=2000,  help='Number of single object checks to time')
+        parser.add_argument('--page-size',  type=int, default=500,   help='Objects per batched (prime) lookup')
+        parser.add_argument('--chunk-size', type=int, default=ObjectPermission.objects.chunk_size)
+
+    def report(self, label, count, seconds):
+        self.stdout.write(f'{label:<28} {count:>10} in {seconds:8.2f}s  ({count / seconds:,.0f}/s)')
+
+    def handle(self, *args, **options):
+        content_type    =   ContentType.objects.get_for_model(ImageMaster)
+        permission      =   Permission.objects.get(content_type=content_type, codename='view_imagemaster')
+        object_ids      =   range(1, options['objects'] + 1)
+
+        try:
+            with transaction.atomic():
+                users = get_user_model().objects.bulk_create([
+                    get_user_model()(email=f'benchmark-{i}@objperm.invalid') for i in range(options['users'])
+                ])
+
+                start   =   time.perf_counter()
+                sent    =   ObjectPermission.objects.grant_bulk(users, permission, object_ids, chunk_size=options['chunk_size'])
+                self.report('grant_bulk', sent, time.perf_counter() - start)
+
+                start   =   time.perf_counter()
+                ObjectPermission.objects.grant_bulk(users[:1], permission, object_ids, chunk_size=options['chunk_size'])
+                self.report('grant_bulk (all conflicts)', len(object_ids), time.perf_counter() - start)
+
+                start = time.perf_counter()
+                for _ in range(options['lookups']):
+                    permission_grants(random.choice(users), ImageMaster, permission.codename).filter(object_id=random.choice(object_ids)).exists()
+                self.report('single object check', options['lookups'], time.perf_counter() - start)
+
+                pages   =   max(1, options['lookups'] // options['page_size'])
+                start   =   time.perf_counter()
+                for _ in range(pages):
+                    first = random.randrange(1, max(2, options['objects'] - options['page_size']))
+                    list(
+                        permission_grants(random.choice(users), ImageMaster, permission.codename)
+                        .filter(object_id__in=range(first, first + options['page_size']))
+                        .values_list('object_id', flat=True)
+                    )
+                self.report('page check (objects)', pages * options['page_size'], time.perf_counter() - start)
+
+                start   =   time.perf_counter()
+                revoked =   ObjectPermission.objects.revoke_bulk(users, permission, object_ids, chunk_size=options['chunk_size'])
+                self.report('revoke_bulk', revoked, time.perf_counter() - start)
+
+                raise Rollback
+        except Rollback:
+            pass
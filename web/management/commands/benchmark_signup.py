@@ -0,0 +1,48 @@
+import time
+import uuid
+from datetime                       import date
+
+from django.contrib.auth            import get_user_model
+from django.core.management.base    import BaseCommand
+
+from web                            import schema_pool
+from web.models                     import Startup
+
+
+class Command(BaseCommand):
+    help = 'Time Startup creation with the schema pool, the template clone and plain migrations. Created tenants are dropped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs',       type=int, default=3, help='Startups created per strategy')
+        parser.add_argument('--strategy',   action='append', choices=schema_pool.PROVISIONING_STRATEGIES, help='Only these strategies (repeatable)')
+
+    def handle(self, *args, **options):
+        owner, _    =   get_user_model().objects.get_or_create(email='benchmark-signup@startup.invalid')
+        strategies  =   options['strategy'] or schema_pool.PROVISIONING_STRATEGIES
+
+        for strategy in strategies:
+            if strategy == 'pool':
+                schema_pool.fill_pool(len(schema_pool.pool_schemas()) + options['runs'])
+            if strategy == 'template':
+                schema_pool.build_template()
+
+            timings = []
+            for _ in range(options['runs']):
+                startup = Startup(
+                    schema_name     =   f'bench_{uuid.uuid4().hex[:12]}',
+                    name            =   'Signup benchmark',
+                    paid_until      =   date.today(),
+                    on_trial        =   True,
+                    owner           =   owner,
+                )
+                startup.schema_provisioning = (strategy,)
+
+                start = time.perf_counter()
+                startup.save()
+                timings.append(time.perf_counter() - start)
+
+                startup.delete(force_drop=True)
+
+            self.stdout.write(
+                f'{strategy:<10} min {min(timings) * 1000:8.1f} ms   avg {sum(timings) / len(timings) * 1000:8.1f} ms   max {max(timings) * 1000:8.1f} ms'
+            )
@@ -0,0 +1,62 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf                    import settings
+from django.core.management.base    import BaseCommand, CommandError
+
+
+# Runs manage.py in a fresh interpreter, optionally building the Azure client first
+# the way settings.py used to at import time
+MANAGE_PY = '''
+import sys
+if {eager_azure}:
+    from azure.identity import DefaultAzureCredential
+    from azure.keyvault.secrets import SecretClient
+    SecretClient(vault_url="https://example.vault.azure.net/", credential=DefaultAzureCredential())
+sys.argv = ["manage.py", "check"]
+sys.path.insert(0, {base_dir!r})
+import runpy
+runpy.run_path({manage_py!r}, run_name="__main__")
+'''
+
+
+class Command(BaseCommand):
+    help = 'Measure the wall time of `manage.py check` in fresh processes, with the lazy secret store and with an import time Azure client.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs',           type=int, default=5, help='Processes started per measurement')
+        parser.add_argument('--secrets-backend',default='env', choices=('azure', 'file', 'env'), help='SECRETS_BACKEND of the child processes')
+        parser.add_argument('--no-eager',       action='store_true', help='Skip the import time Azure client measurement')
+
+    def run_check(self, eager_azure, environ):
+        script = MANAGE_PY.format(
+            eager_azure =   eager_azure,
+            base_dir    =   str(settings.BASE_DIR),
+            manage_py   =   str(settings.BASE_DIR / 'manage.py'),
+        )
+        start   =   time.perf_counter()
+        result  =   subprocess.run([sys.executable, '-c', script], env=environ, capture_output=True, text=True)
+        elapsed =   time.perf_counter() - start
+        if result.returncode:
+            raise CommandError(f'manage.py check failed:\n{result.stderr}')
+        return elapsed
+
+    def measure(self, label, eager_azure, environ, runs):
+        # The first run warms the filesystem and bytecode caches, it is not counted
+        self.run_check(eager_azure, environ)
+        timings = [self.run_check(eager_azure, environ) for _ in range(runs)]
+        self.stdout.write(f'{label:<44} median {statistics.median(timings) * 1000:8.1f} ms   min {min(timings) * 1000:8.1f} ms')
+
+    def handle(self, *args, **options):
+        environ = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE'    :   os.environ.get('DJANGO_SETTINGS_MODULE', settings.SETTINGS_MODULE),
+            'SECRETS_BACKEND'           :   options['secrets_backend'],
+        }
+
+        self.measure('manage.py check, lazy secrets', False, environ, options['runs'])
+        if not options['no_eager']:
+            self.measure('manage.py check, import time Azure client', True, environ, options['runs'])
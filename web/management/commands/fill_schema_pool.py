@@ -0,0 +1,21 @@
+from django.core.management.base    import BaseCommand
+
+from web                            import schema_pool
+
+
+class Command(BaseCommand):
+    help = 'Keep a pool of migrated, unassigned tenant schemas (and the template they are cloned from) ready for new Startups.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size',           type=int, default=schema_pool.TENANT_SCHEMA_POOL_SIZE, help='Number of pool schemas to keep')
+        parser.add_argument('--no-template',    action='store_true', help='Do not create/migrate the template schema, migrate every pool schema from scratch')
+
+    def handle(self, *args, **options):
+        verbosity = max(0, options['verbosity'] - 1)
+
+        if not options['no_template']:
+            schema_pool.build_template(verbosity)
+            self.stdout.write(f'Template schema "{schema_pool.TENANT_TEMPLATE_SCHEMA}" is up to date')
+
+        migrated, created = schema_pool.fill_pool(options['size'], verbosity)
+        self.stdout.write(self.style.SUCCESS(f'{len(migrated)} pool schemas migrated, {len(created)} created'))
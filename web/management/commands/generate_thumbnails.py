@@ -0,0 +1,36 @@
+from concurrent.futures             import ThreadPoolExecutor, as_completed
+
+from django.core.management.base    import BaseCommand
+from django.db                      import connection
+
+from web                            import thumbnails
+from web.models                     import ImageMaster
+
+
+class Command(BaseCommand):
+    help = 'Generate missing or outdated ImageMaster thumbnails in parallel.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers',    type=int, default=thumbnails.THUMBNAIL_WORKERS * 2, help='Parallel thumbnail workers')
+        parser.add_argument('--force',      action='store_true', help='Regenerate thumbnails that are already up to date')
+
+    def handle(self, *args, **options):
+        tenant      =   getattr(connection, 'tenant', None)
+        rows        =   ImageMaster.objects.exclude(image='').only('pk', 'image', 'renditions')
+        pending     =   [obj.pk for obj in rows.iterator() if options['force'] or thumbnails.needs_thumbnails(obj)]
+        failed      =   0
+
+        self.stdout.write(f'{len(pending)} images to process with {options["workers"]} workers')
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {pool.submit(thumbnails.generate_in_worker, ImageMaster, pk, tenant): pk for pk in pending}
+            for done, future in enumerate(as_completed(futures), start=1):
+                try:
+                    future.result()
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f'ImageMaster {futures[future]}: {e}')
+                if done % 100 == 0:
+                    self.stdout.write(f'{done}/{len(pending)}')
+
+        self.stdout.write(self.style.SUCCESS(f'{len(pending) - failed} thumbnails generated, {failed} failed'))
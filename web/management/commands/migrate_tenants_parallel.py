@@ -0,0 +1,152 @@
+import contextlib
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import time
+
+from django.core.management         import call_command
+from django.core.management.base    import BaseCommand, CommandError
+from django.db                      import connection, connections
+from django.db.migrations.executor  import MigrationExecutor
+from django.db.migrations.loader    import MigrationLoader
+
+# Django Tenants
+from django_tenants.utils           import get_tenant_model, get_public_schema_name, get_tenant_migration_order, schema_exists
+
+from web                            import schema_pool
+
+
+def pending_migrations(schema_name):
+    connection.set_schema(schema_name)
+    executor    =   MigrationExecutor(connection)
+    plan        =   executor.migration_plan(executor.loader.graph.leaf_nodes())
+    return [f'{migration.app_label}.{migration.name}' for migration, backwards in plan]
+
+
+def migrate_tenant(job):
+    '''
+    Runs in a pool process. Never raises: a failing tenant is reported and the others go on.
+    '''
+    schema_name, dry_run, verbosity = job
+    output  =   io.StringIO()
+    start   =   time.perf_counter()
+    result  =   {'schema': schema_name, 'pending': [], 'error': None}
+
+    try:
+        result['pending'] = pending_migrations(schema_name)
+        if result['pending'] and not dry_run:
+            with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+                call_command('migrate_schemas', tenant=True, schema_name=schema_name, interactive=False, verbosity=verbosity)
+    except Exception as e:
+        result['error'] = f'{type(e).__name__}: {e}'
+    finally:
+        connections.close_all()
+
+    result['seconds']   =   time.perf_counter() - start
+    result['output']    =   output.getvalue()
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        'Migrate tenant schemas in parallel. Up to date tenants are skipped, failures do not stop the run '
+        'and a checkpoint file lets a failed run continue where it stopped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes',          type=int, default=os.cpu_count(), help='Worker processes')
+        parser.add_argument('--max-connections',    type=int, default=10, help='Upper bound on database connections held by workers')
+        parser.add_argument('--checkpoint',         default='migrate_tenants.checkpoint.json', help='Checkpoint file')
+        parser.add_argument('--restart',            action='store_true', help='Ignore an existing checkpoint')
+        parser.add_argument('--dry-run',            action='store_true', help='Only report tenants with pending migrations')
+        parser.add_argument('--include-pool',       action='store_true', help='Also migrate the schema pool and its template')
+        parser.add_argument('--schema',             action='append', dest='schemas', help='Only these schemas (repeatable)')
+
+    @staticmethod
+    def migration_target():
+        # Checkpoints are only valid for the same set of migrations
+        leaves = sorted(f'{app}.{name}' for app, name in MigrationLoader(None, ignore_no_migrations=True).graph.leaf_nodes())
+        return hashlib.sha1(json.dumps(leaves).encode()).hexdigest()
+
+    def get_schemas(self, options):
+        tenants         =   get_tenant_model().objects.exclude(schema_name=get_public_schema_name())
+        migration_order =   get_tenant_migration_order()
+        if migration_order is not None:
+            tenants = tenants.order_by(*migration_order)
+
+        schemas = list(tenants.values_list('schema_name', flat=True))
+        if options['include_pool']:
+            schemas += schema_pool.pool_schemas()
+            if schema_exists(schema_pool.TENANT_TEMPLATE_SCHEMA):
+                schemas.append(schema_pool.TENANT_TEMPLATE_SCHEMA)
+        if options['schemas']:
+            schemas = [schema for schema in schemas if schema in options['schemas']]
+        return schemas
+
+    def load_checkpoint(self, path, target, restart):
+        if restart or not os.path.exists(path):
+            return {'target': target, 'schemas': {}}
+        with open(path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('target') != target:
+            self.stdout.write('Checkpoint is for a different set of migrations, starting over')
+            return {'target': target, 'schemas': {}}
+        return checkpoint
+
+    @staticmethod
+    def save_checkpoint(path, checkpoint):
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(checkpoint, f, indent=2)
+        os.replace(f'{path}.tmp', path)
+
+    def handle(self, *args, **options):
+        target      =   self.migration_target()
+        checkpoint  =   self.load_checkpoint(options['checkpoint'], target, options['restart'] or options['dry_run'])
+        done        =   {schema for schema, state in checkpoint['schemas'].items() if state['status'] == 'done'}
+        schemas     =   [schema for schema in self.get_schemas(options) if schema not in done]
+        processes   =   max(1, min(options['processes'], options['max_connections'], len(schemas) or 1))
+        verbosity   =   options['verbosity']
+
+        if done:
+            self.stdout.write(f'{len(done)} schemas already migrated according to {options["checkpoint"]}')
+        self.stdout.write(f'{len(schemas)} schemas to check with {processes} processes')
+
+        # Children must not share the parent's connection
+        connections.close_all()
+
+        failed  =   []
+        started =   time.perf_counter()
+        jobs    =   [(schema, options['dry_run'], verbosity) for schema in schemas]
+
+        with multiprocessing.get_context('fork').Pool(processes=processes, maxtasksperchild=50) as pool:
+            for count, result in enumerate(pool.imap_unordered(migrate_tenant, jobs), start=1):
+                schema = result['schema']
+
+                if result['error']:
+                    failed.append(schema)
+                    status = 'failed'
+                    self.stderr.write(f'[{count}/{len(jobs)}] {schema}: FAILED after {result["seconds"]:.1f}s - {result["error"]}')
+                    if result['output'] and verbosity > 1:
+                        self.stderr.write(result['output'])
+                elif options['dry_run']:
+                    status = 'pending' if result['pending'] else 'done'
+                    if result['pending']:
+                        self.stdout.write(f'{schema}: {len(result["pending"])} pending - {", ".join(result["pending"])}')
+                else:
+                    status = 'done'
+                    label  = f'{len(result["pending"])} migrations applied' if result['pending'] else 'up to date'
+                    self.stdout.write(f'[{count}/{len(jobs)}] {schema}: {label} in {result["seconds"]:.1f}s')
+                    if result['output'] and verbosity > 1:
+                        self.stdout.write(result['output'])
+
+                if not options['dry_run']:
+                    checkpoint['schemas'][schema] = {'status': status, 'seconds': round(result['seconds'], 3), 'error': result['error']}
+                    self.save_checkpoint(options['checkpoint'], checkpoint)
+
+        self.stdout.write(f'Finished in {time.perf_counter() - started:.1f}s, {len(failed)} failed')
+        if failed:
+            raise CommandError(f'Migrations failed for: {", ".join(failed)}. Run again to resume.')
+        if not options['dry_run'] and os.path.exists(options['checkpoint']):
+            os.remove(options['checkpoint'])
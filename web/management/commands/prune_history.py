@@ -0,0 +1,149 @@
+import gzip
+import json
+import os
+from datetime                           import timedelta
+
+from django.apps                        import apps
+from django.core.management.base        import BaseCommand
+from django.core.serializers.json       import DjangoJSONEncoder
+from django.db                          import connection
+from django.db.models                   import F, Q, Window
+from django.db.models.functions         import RowNumber
+from django.utils                       import timezone
+
+# Django Tenants
+from django_tenants.utils               import get_tenant_model, get_public_schema_name, schema_context
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply the history retention declared in each model's admin_meta['history_retention'] "
+        "(e.g. {'days': 90, 'versions': 20}) in every tenant schema."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--schema',         action='append', dest='schemas', help='Only prune these schemas (repeatable)')
+        parser.add_argument('--batch-size',     type=int, default=5000, help='Rows deleted per statement')
+        parser.add_argument('--archive-dir',    help='Write pruned rows to <dir>/<schema>/<table>-<timestamp>.jsonl.gz before deleting')
+        parser.add_argument('--dry-run',        action='store_true', help='Count what would be pruned without deleting')
+
+    @staticmethod
+    def get_retention(model):
+        admin_meta = {**getattr(model, 'common_admin_meta', {}), **getattr(model, 'admin_meta', {})}
+        return admin_meta.get('history_retention') or {}
+
+    def get_history_models(self):
+        for model in apps.get_models():
+            history = getattr(model, 'history', None)
+            if history is not None and self.get_retention(model):
+                yield model, history.model, self.get_retention(model)
+
+    @staticmethod
+    def expired(history_model, retention):
+        '''
+        history_ids outside the retention policy, older than `days` or beyond the last `versions`
+        of their object, each row once. A queryset, None without a policy.
+        '''
+        queryset    =   history_model._default_manager.all()
+        outside     =   Q()
+
+        if retention.get('days'):
+            outside |= Q(history_date__lt=timezone.now() - timedelta(days=retention['days']))
+
+        if retention.get('versions'):
+            queryset = queryset.annotate(version=Window(RowNumber(), partition_by=[F('id')], order_by=F('history_date').desc()))
+            outside |= Q(version__gt=retention['versions'])
+
+        if not outside:
+            return None
+        return queryset.filter(outside).order_by().values_list('history_id', flat=True)
+
+    @staticmethod
+    def row_bytes(table, ids):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COALESCE(SUM(pg_column_size(t.*)), 0) FROM {connection.ops.quote_name(table)} t WHERE history_id = ANY(%s)',
+                [list(ids)],
+            )
+            return cursor.fetchone()[0]
+
+    @staticmethod
+    def measure(table, expired):
+        '''
+        (rows, bytes) of the expired rows, counted in the database for --dry-run.
+        '''
+        sql, params = expired.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*), COALESCE(SUM(pg_column_size(t.*)), 0) FROM {connection.ops.quote_name(table)} t WHERE history_id IN ({sql})',
+                params,
+            )
+            return cursor.fetchone()
+
+    def archive(self, archive_file, history_model, ids):
+        for row in history_model._default_manager.filter(history_id__in=ids).values().iterator():
+            archive_file.write(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+
+    def prune_model(self, schema_name, history_model, retention, options):
+        table       =   history_model._meta.db_table
+        rows        =   0
+        size        =   0
+        archive     =   None
+
+        expired = self.expired(history_model, retention)
+        if expired is None:
+            return rows, size
+        if options['dry_run']:
+            return self.measure(table, expired)
+
+        if options['archive_dir']:
+            directory   =   os.path.join(options['archive_dir'], schema_name)
+            os.makedirs(directory, exist_ok=True)
+            archive     =   gzip.open(os.path.join(directory, f"{table}-{timezone.now():%Y%m%d%H%M%S}.jsonl.gz"), 'wt', encoding='utf-8')
+
+        try:
+            # One LIMIT batch at a time, deleted rows drop out of the next one. Only batch_size ids are held.
+            # Deleting the oldest versions leaves the row numbers of the kept ones as they were.
+            while True:
+                ids = list(expired[:options['batch_size']])
+                if not ids:
+                    break
+                size += self.row_bytes(table, ids)
+                if archive:
+                    self.archive(archive, history_model, ids)
+                rows += history_model._default_manager.filter(history_id__in=ids)._raw_delete(connection.alias)
+        finally:
+            if archive:
+                archive.close()
+
+        return rows, size
+
+    def handle(self, *args, **options):
+        history_models = list(self.get_history_models())
+        if not history_models:
+            self.stdout.write('No model declares admin_meta["history_retention"], nothing to prune.')
+            return
+
+        schemas = [get_public_schema_name()] + list(
+            get_tenant_model().objects.exclude(schema_name=get_public_schema_name()).values_list('schema_name', flat=True)
+        )
+        if options['schemas']:
+            schemas = [schema for schema in schemas if schema in options['schemas']]
+
+        for schema_name in schemas:
+            with schema_context(schema_name):
+                tables          =   set(connection.introspection.table_names())
+                total_rows      =   0
+                total_bytes     =   0
+
+                for model, history_model, retention in history_models:
+                    if history_model._meta.db_table not in tables:
+                        continue
+                    rows, size = self.prune_model(schema_name, history_model, retention, options)
+                    total_rows  +=  rows
+                    total_bytes +=  size
+                    if rows:
+                        self.stdout.write(f'  {schema_name}.{history_model._meta.db_table}: {rows} rows, {size} bytes')
+
+                verb = 'would be pruned' if options['dry_run'] else 'pruned'
+                self.stdout.write(self.style.SUCCESS(f'{schema_name}: {total_rows} rows ({total_bytes} bytes) {verb}'))
@@ -0,0 +1,193 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections                    import defaultdict
+
+from django.conf                    import settings
+from django.core.management.base    import BaseCommand, CommandError
+
+
+MARKER = 'STARTUP-PROFILE:'
+
+# Runs in a fresh interpreter started with -X importtime: what a new worker does before its first request
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+
+import django
+from django.apps.config import AppConfig
+
+timings = {"apps": {}}
+
+def timed(label, phase, func):
+    def wrapper(*args, **kwargs):
+        began = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings["apps"].setdefault(label, {})[phase] = time.perf_counter() - began
+    return wrapper
+
+create = AppConfig.create.__func__
+def timed_create(cls, entry):
+    began       =   time.perf_counter()
+    app_config  =   create(cls, entry)
+    timings["apps"].setdefault(app_config.label, {})["import"] = time.perf_counter() - began
+    app_config.import_models    =   timed(app_config.label, "models", app_config.import_models)
+    app_config.ready            =   timed(app_config.label, "ready", app_config.ready)
+    return app_config
+AppConfig.create = classmethod(timed_create)
+
+began = time.perf_counter()
+from django.conf import settings
+settings.INSTALLED_APPS
+timings["settings"] = time.perf_counter() - began
+
+began = time.perf_counter()
+django.setup(set_prefix=False)
+timings["setup"] = time.perf_counter() - began
+
+began = time.perf_counter()
+from django.core.handlers.wsgi import WSGIHandler
+WSGIHandler()
+timings["middleware"] = time.perf_counter() - began
+
+began = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+timings["urls"] = time.perf_counter() - began
+
+timings["total"] = time.perf_counter() - start
+print(%r + json.dumps(timings))
+''' % MARKER
+
+IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+PHASES      = ('settings', 'setup', 'middleware', 'urls', 'total')
+
+
+def parse_import_times(stderr):
+    '''
+    [(module, self µs, cumulative µs, depth)] from the -X importtime report.
+    '''
+    modules = []
+    for line in stderr.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            modules.append((name, int(own), int(cumulative), len(indent) // 2))
+    return modules
+
+
+class Command(BaseCommand):
+    help = (
+        'Profile a cold start in fresh processes: settings, app import/models/ready per AppConfig, middleware, '
+        'URLconf and import time per module. With --baseline or --budget it fails when the cold start regressed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs',           type=int,   default=3,  help='Processes started, timings are the median')
+        parser.add_argument('--limit',          type=int,   default=20, help='Modules and packages listed')
+        parser.add_argument('--settings-module',            default=None, help='DJANGO_SETTINGS_MODULE of the probe, default the current one')
+        parser.add_argument('--json',           action='store_true', help='Print the profile as JSON')
+        parser.add_argument('--save-baseline',  metavar='FILE', help='Write the phase timings to FILE')
+        parser.add_argument('--baseline',       metavar='FILE', help='Fail when the cold start is slower than FILE by more than --tolerance')
+        parser.add_argument('--tolerance',      type=float, default=20, help='Allowed slowdown against --baseline, percent')
+        parser.add_argument('--budget',         type=float, default=None, help='Fail when the cold start takes more than this many ms')
+
+    def probe(self, settings_module):
+        environ = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module}
+        began   = time.perf_counter()
+        result  = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', PROBE],
+            cwd=str(settings.BASE_DIR), env=environ, capture_output=True, text=True,
+        )
+        elapsed = time.perf_counter() - began
+        output  = [line for line in result.stdout.splitlines() if line.startswith(MARKER)]
+        if result.returncode or not output:
+            errors = '\n'.join(line for line in result.stderr.splitlines() if not line.startswith('import time:'))
+            raise CommandError(f'Startup probe failed:\n{errors}')
+
+        timings = json.loads(output[-1][len(MARKER):])
+        timings['process'] = elapsed
+        return timings, parse_import_times(result.stderr)
+
+    def profile(self, runs, settings_module):
+        probes  =   [self.probe(settings_module) for _ in range(runs)]
+        median  =   lambda values: statistics.median(values) * 1000
+
+        apps = defaultdict(dict)
+        for label in probes[0][0]['apps']:
+            for phase in ('import', 'models', 'ready'):
+                apps[label][phase] = median([timings['apps'].get(label, {}).get(phase, 0) for timings, modules in probes])
+
+        # Import times of the last run, the earlier ones warmed the filesystem cache
+        modules     =   probes[-1][1]
+        packages    =   defaultdict(int)
+        for name, own, cumulative, depth in modules:
+            packages[name.split('.')[0]] += own
+
+        return {
+            'settings_module'   :   settings_module,
+            'runs'              :   runs,
+            'phases'            :   {phase: median([timings[phase] for timings, modules in probes]) for phase in (*PHASES, 'process')},
+            'apps'              :   dict(apps),
+            'modules'           :   sorted(({'module': name, 'self_ms': own / 1000, 'cumulative_ms': cumulative / 1000} for name, own, cumulative, depth in modules), key=lambda row: -row['cumulative_ms']),
+            'packages'          :   sorted(({'package': name, 'self_ms': own / 1000} for name, own in packages.items()), key=lambda row: -row['self_ms']),
+        }
+
+    def report(self, profile, limit):
+        write = self.stdout.write
+        write(f'{profile["settings_module"]}, median of {profile["runs"]} cold starts\n')
+
+        for phase, ms in profile['phases'].items():
+            write(f'  {phase:<30} {ms:9.1f} ms')
+
+        write('\nAppConfig                          import     models      ready')
+        for label, phases in sorted(profile['apps'].items(), key=lambda item: -sum(item[1].values())):
+            write(f'  {label:<30} {phases["import"]:9.1f} {phases["models"]:10.1f} {phases["ready"]:10.1f}')
+
+        write('\nModule (cumulative)')
+        for row in profile['modules'][:limit]:
+            write(f'  {row["module"]:<50} {row["cumulative_ms"]:9.1f} ms')
+
+        write('\nPackage (self)')
+        for row in profile['packages'][:limit]:
+            write(f'  {row["package"]:<50} {row["self_ms"]:9.1f} ms')
+
+    def handle(self, *args, **options):
+        settings_module =   options['settings_module'] or os.environ.get('DJANGO_SETTINGS_MODULE') or settings.SETTINGS_MODULE
+        profile         =   self.profile(max(options['runs'], 1), settings_module)
+
+        if options['json']:
+            self.stdout.write(json.dumps(profile, indent=2))
+        else:
+            self.report(profile, options['limit'])
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as file:
+                json.dump({'settings_module': settings_module, 'phases': profile['phases']}, file, indent=2)
+
+        # Regression check
+        total       =   profile['phases']['total']
+        failures    =   []
+        if options['budget'] is not None and total > options['budget']:
+            failures.append(f'cold start {total:.1f} ms is over the {options["budget"]:.1f} ms budget')
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)['phases']
+            # Only the total fails the check, a slower phase alone is reported
+            for phase in PHASES:
+                allowed = baseline[phase] * (1 + options['tolerance'] / 100)
+                if profile['phases'][phase] <= allowed:
+                    continue
+                message = f'{phase} {profile["phases"][phase]:.1f} ms, baseline {baseline[phase]:.1f} ms (+{options["tolerance"]:g}% allowed)'
+                if phase == 'total':
+                    failures.append(message)
+                else:
+                    self.stderr.write(message)
+        if failures:
+            raise CommandError('Startup regression: ' + '; '.join(failures))
@@ -1,17 +1,19 @@
-from django.db                          import models, IntegrityError
+from django.db                          import models, IntegrityError, transaction
 from django.db.models.aggregates        import Max
 from django.contrib.sessions.models     import Session
+from django.contrib.sessions.base_session import AbstractBaseSession
 from django.contrib.auth.models         import User, Permission
 from django.db.models                   import Avg
 from django.contrib.auth                import get_user_model
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions             import ValidationError
 
 # Ckeditor
 from tinymce.models                 import HTMLField
 
 # Signals
-from django.db.models.signals       import pre_save, post_save
+from django.db.models.signals       import pre_save, post_save, post_delete
 from django.dispatch                import receiver
 
 # HTML Safe String  
@@ -41,6 +43,7 @@ from django.core.validators import MaxValueValidator, MinValueValidator
 
 # Urllib
 import urllib.parse
+from django.urls    import reverse
 
 # Timezone
 from django.utils   import timezone
@@ -50,17 +53,123 @@ from jsoneditor.forms import JSONEditor
 
 # Django Tenants
 from django_tenants.models import TenantMixin, DomainMixin
+from django_tenants.utils  import schema_exists
+from django_tenants.postgresql_backend.base import _check_schema_name
+from web                   import schema_pool
 
 # Django Tenant User
 from tenant_users.tenants.models import TenantBase, UserProfile
 
 # Simple History Model
 from simple_history.models import HistoricalRecords
+from web.history           import BufferedHistoricalRecords
+
+# Thumbnails
+from web                import thumbnails, site_settings, navigation, json_schema, caching
+from django.utils.functional import cached_property
+
+# Object Permission Resolver
+from web.permissions    import PermissionResolver, filter_permitted, object_permissions_changed
+
+
+# Object Permissions Manager
+class ObjectPermissionManager(models.Manager):
+    '''
+    Set based writes for object permissions.
+    `objects` can be model instances, primary keys or a queryset; `users` can be instances or ids.
+    Bulk writes skip model signals so object_permissions_changed is sent once per call instead.
+    '''
+    chunk_size = 5000
+
+    @staticmethod
+    def _ids(items):
+        if isinstance(items, models.QuerySet):
+            return items.values_list('pk', flat=True).iterator(chunk_size=ObjectPermissionManager.chunk_size)
+        return (getattr(item, 'pk', item) for item in items)
+
+    @staticmethod
+    def _chunks(ids, size):
+        chunk = []
+        for pk in ids:
+            chunk.append(pk)
+            if len(chunk) >= size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _changed(self, user_ids, permission, object_ids=None):
+        object_permissions_changed.send(
+            sender          =   self.model,
+            user_ids        =   user_ids,
+            content_type_id =   permission.content_type_id,
+            object_ids      =   object_ids,
+        )
 
-# Model Utils
-from model_utils        import FieldTracker
-from model_utils.fields import MonitorField, StatusField
-
+    def grant_bulk(self, users, permission, objects, chunk_size=None):
+        '''
+        Grant `permission` on every object to every user. Existing grants are left as they are.
+        Returns the number of rows sent to the database.
+        '''
+        chunk_size  =   chunk_size or self.chunk_size
+        user_ids    =   list(self._ids(users))
+        # Rows per object, keep every insert statement around chunk_size rows
+        per_chunk   =   max(1, chunk_size // max(1, len(user_ids)))
+        sent        =   0
+
+        for object_ids in self._chunks(self._ids(objects), per_chunk):
+            rows = [
+                self.model(user_id=user_id, permission=permission, object_id=object_id, content_type_id=permission.content_type_id)
+                for object_id in object_ids for user_id in user_ids
+            ]
+            self.bulk_create(rows, batch_size=chunk_size, ignore_conflicts=True)
+            sent += len(rows)
+
+        self._changed(user_ids, permission)
+        return sent
+
+    def revoke_bulk(self, users, permission, objects=None, chunk_size=None):
+        '''
+        Remove `permission` on the objects from the users, or on every object if `objects` is None.
+        Returns the number of deleted rows.
+        '''
+        chunk_size  =   chunk_size or self.chunk_size
+        user_ids    =   list(self._ids(users))
+        queryset    =   self.filter(user_id__in=user_ids, permission=permission, content_type_id=permission.content_type_id)
+        deleted     =   0
+
+        if objects is None:
+            # chunk_size rows of the lowest primary keys per DELETE, until none are left
+            while True:
+                pks = list(queryset.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+                if not pks:
+                    break
+                deleted += self.filter(pk__in=pks)._raw_delete(self.db)
+        else:
+            for object_ids in self._chunks(self._ids(objects), chunk_size):
+                deleted += queryset.filter(object_id__in=object_ids)._raw_delete(self.db)
+
+        self._changed(user_ids, permission)
+        return deleted
+
+    def sync_for_object(self, obj, permission, users):
+        '''
+        Make `users` the exact set of users holding `permission` on `obj`.
+        Returns (granted, revoked).
+        '''
+        user_ids    =   set(self._ids(users))
+        queryset    =   self.filter(permission=permission, content_type_id=permission.content_type_id, object_id=obj.pk)
+
+        with transaction.atomic(using=self.db):
+            current =   set(queryset.values_list('user_id', flat=True))
+            revoked =   queryset.filter(user_id__in=current - user_ids)._raw_delete(self.db) if current - user_ids else 0
+            granted =   self.bulk_create(
+                [self.model(user_id=user_id, permission=permission, object_id=obj.pk, content_type_id=permission.content_type_id) for user_id in user_ids - current],
+                ignore_conflicts=True,
+            )
+
+        self._changed(list(user_ids | current), permission, [obj.pk])
+        return len(granted), revoked
 
 
 # Object Permissions
@@ -70,8 +179,26 @@ class ObjectPermission(models.Model):
     object_id       =   models.PositiveIntegerField()
     content_type    =   models.ForeignKey('contenttypes.ContentType', on_delete=models.CASCADE)
 
+    objects         =   ObjectPermissionManager()
+
     class Meta:
         unique_together = ('user', 'permission', 'object_id', 'content_type')
+        indexes         = [
+            # Grants of one object (sync_for_object, cleanup on delete)
+            models.Index(fields=['content_type', 'object_id'], name='objperm_ct_object_idx'),
+            # check_object_permission / filter_permitted lookups
+            models.Index(fields=['user', 'content_type', 'permission'], name='objperm_user_ct_perm_idx'),
+        ]
+
+# Common QuerySet
+class CommonQuerySet(models.QuerySet):
+    def filter_permitted(self, user, permission_codename):
+        '''
+        Only the records the user has `permission_codename` on.
+        The check is done in SQL instead of calling check_object_permission per row.
+        '''
+        return filter_permitted(self, user, permission_codename)
+
 
 # Common Model
 class CommonModel(models.Model):
@@ -82,31 +209,39 @@ class CommonModel(models.Model):
     updated_by              =   models.ForeignKey       (settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="%(class)s_updated_by", null=True, blank=True)
     has_object_permission   =   models.BooleanField     (default=False, help_text="Make it true if you want to add object level permissions for this record.")
 
-    history                 =   HistoricalRecords()
-    tracker                 =   FieldTracker()
+    history                 =   BufferedHistoricalRecords(inherit=True)
+
+    objects                 =   CommonQuerySet.as_manager()
 
     # Common Admin Meta for all models
     common_admin_meta = {
     }
     
-    def check_object_permission(self, user, permission_codename):
-        # Pass true if the user has the specified permission for this object.
-        # It will allow all permissions if has_object_permission is False for this record.
-        if not self.has_object_permission:
-            return True
+    def clean(self):
+        super().clean()
+        self.clean_json_fields()
+        # full_clean() already checked them, save() does not again
+        self._json_fields_cleaned = True
+
+    def clean_json_fields(self):
+        '''
+        Validate JSONFields against the schemas in admin_meta['json_fields'] (compiled once per model).
+        Raises ValidationError({field: [errors]}).
+        '''
+        json_schema.validate_instance(self)
+
+    def save(self, *args, **kwargs):
+        if not self.__dict__.pop('_json_fields_cleaned', False):
+            self.clean_json_fields()
+        super().save(*args, **kwargs)
 
+    def check_object_permission(self, user, permission_codename):
         """
         Check if the user has a specific permission for this object.
+        It will allow all permissions if has_object_permission is False for this record.
+        Use PermissionResolver(user).prime(objects, codename) first when checking many objects.
         """
-        content_type    = ContentType.objects.get_for_model(self)
-        permission      = Permission.objects.get(content_type=content_type, codename=permission_codename)
-
-        return ObjectPermission.objects.filter(
-            user            =   user,
-            permission      =   permission,
-            object_id       =   self.pk,
-            content_type    =   content_type,
-        ).exists()
+        return PermissionResolver(user).has_object_permission(self, permission_codename)
     
     class Meta:
         abstract = True
@@ -116,6 +251,7 @@ class CommonModel(models.Model):
 class ImageMaster(CommonModel):
     name                =   models.CharField        (max_length=300)
     image               =   models.ImageField       (upload_to="image_master/")
+    renditions          =   models.JSONField        (blank=True, null=True, editable=False, help_text="Generated thumbnails: {'source': ..., 'WEBP': {'path', 'width', 'height'}, ...}")
 
     admin_meta = {
         'list_display': ['name', 'image','__str__', 'created_at', 'updated_at', 'created_by', 'updated_by', 'has_object_permission'],   
@@ -126,11 +262,34 @@ class ImageMaster(CommonModel):
     def test_action(self, obj, request):
         print(obj)
 
+    @cached_property
+    def thumbnail_url(self):
+        # Falls back to the original until the thumbnail worker has run
+        for image_format in thumbnails.THUMBNAIL_FORMATS:
+            rendition = (self.renditions or {}).get(image_format)
+            if rendition and self.renditions.get('source') == self.image.name:
+                return self.image.storage.url(rendition['path'])
+        return self.image.url if self.image else ''
+
+    @property
+    def media_url(self):
+        # Permission checked, range capable download (web.views.image_master_media)
+        return reverse('image_master_media', args=[self.pk])
+
     def __str__(self):
         return mark_safe(
-            '<div style="height:200px;width:200px;"><img src='+self.image.url+' style="object-fit:contain;height:100%;width:100%" alt=""></div>'
+            '<div style="height:200px;width:200px;"><img src='+self.thumbnail_url+' loading="lazy" style="object-fit:contain;height:100%;width:100%" alt=""></div>'
         )
 
+@receiver(post_save, sender=ImageMaster)
+def image_master_thumbnails(sender, instance, raw=False, **kwargs):
+    if not raw and thumbnails.needs_thumbnails(instance):
+        thumbnails.schedule(instance)
+
+@receiver(post_delete, sender=ImageMaster)
+def image_master_thumbnails_cleanup(sender, instance, **kwargs):
+    transaction.on_commit(lambda: thumbnails.delete(instance))
+
 
 # File Master
 class FileMaster(CommonModel):
@@ -141,6 +300,11 @@ class FileMaster(CommonModel):
         'list_display': ['name', 'file', '__str__', 'created_at', 'updated_at', 'created_by', 'updated_by'],   
     }
 
+    @property
+    def media_url(self):
+        # Permission checked, range capable download (web.views.file_master_media)
+        return reverse('file_master_media', args=[self.pk])
+
     def __str__(self):
         return str(self.name)
 
@@ -161,9 +325,44 @@ class Startup(TenantBase):
     # default true, schema will be automatically created and synced when it is saved
     auto_create_schema = True
 
+    # How create_schema gets the schema, see web/schema_pool.py
+    schema_provisioning = schema_pool.PROVISIONING_STRATEGIES
+
+    def create_schema(self, check_if_exists=False, sync_schema=True, verbosity=1):
+        '''
+        Claim a pre-migrated schema from the pool, else clone the template schema,
+        and only replay the migrations when neither is available.
+        '''
+        # TenantMixin.create_schema's safety check, the name ends up in ALTER/CREATE SCHEMA
+        _check_schema_name(self.schema_name)
+
+        if not sync_schema or (check_if_exists and schema_exists(self.schema_name)):
+            return super().create_schema(check_if_exists, sync_schema, verbosity)
+
+        self.schema_provisioned_by = schema_pool.provision(self.schema_name, self.schema_provisioning, verbosity)
+        return True
+
 class Domain(DomainMixin):
     pass
 
+# Sessions
+class TenantSession(AbstractBaseSession):
+    '''
+    Session row of one tenant, see web/sessions.py (SESSION_ENGINE).
+    '''
+    schema_name     =   models.CharField(max_length=63)
+
+    class Meta:
+        indexes = [
+            # Batched cleanup of one tenant's expired sessions
+            models.Index(fields=['schema_name', 'expire_date'], name='tenantsession_schema_exp_idx'),
+        ]
+
+    @classmethod
+    def get_session_store_class(cls):
+        from web.sessions import SessionStore
+        return SessionStore
+
 # Global Settings
 class SiteSetting(CommonModel):
     logo                    =   models.ImageField   (blank=True,null=True,upload_to='settings/')
@@ -187,6 +386,7 @@ class SiteSetting(CommonModel):
     brochure                =   models.FileField    (blank=True,null=True,upload_to='settings/')
     
     navigation_menu         =   models.JSONField    (blank=True, null=True)
+    navigation_index        =   models.JSONField    (blank=True, null=True, editable=False, help_text="navigation_menu flattened on save, see web/navigation.py")
 
     about_us                =   HTMLField       (blank=True,null=True)
     terms_and_conditions    =   HTMLField       (blank=True,null=True)
@@ -243,18 +443,49 @@ class SiteSetting(CommonModel):
     # Dynamic admin
     admin_meta = {
         "json_fields": {
-            "navigation_menu": {"schema":  json.dumps(key_value_pair_schema)},
+            "navigation_menu": {"schema":  key_value_pair_schema},
         }
     }
     
+    # Large columns get_current() leaves out unless they are asked for
+    lazy_fields = ('extra_contact_details', 'about_us', 'terms_and_conditions', 'privacy_policy', 'return_policy', 'disclaimer')
+
     def __str__(self):
         return 'Edit Site Settings'
 
     class Meta:
         verbose_name_plural = "Site Setting"
-    
+
+    def clean_json_fields(self):
+        super().clean_json_fields()
+        try:
+            self.navigation_index = navigation.flatten(self.navigation_menu)
+        except ValidationError as e:
+            raise ValidationError({'navigation_menu': e.error_list})
+
+    def navigation_breadcrumb(self, item_id):
+        index = navigation.get_index(self)
+        return navigation.breadcrumb(index, item_id) if index else []
+
+    def render_navigation(self):
+        return navigation.render(self)
+
+    @classmethod
+    def get_current(cls, *fields):
+        '''
+        Cached site settings of the current tenant, None if there are none.
+        SiteSetting.get_current('logo', 'favicon') loads just those columns.
+        '''
+        return site_settings.get_current(cls, fields)
+
     def save(self, *args, **kwargs):
         super(SiteSetting, self).save(*args, **kwargs)
+        caching.on_commit(site_settings.invalidate)
+
+    def delete(self, *args, **kwargs):
+        result = super(SiteSetting, self).delete(*args, **kwargs)
+        caching.on_commit(site_settings.invalidate)
+        return result
 
 
 
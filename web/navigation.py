@@ -0,0 +1,94 @@
+from django.core.exceptions         import ValidationError
+from django.utils.html              import format_html, format_html_join
+from django.utils.safestring        import mark_safe
+
+from web                            import site_settings
+
+
+def flatten(menu):
+    '''
+    Precomputed form of a navigation menu validated against its schema, built once on save:
+        {
+            'roots' :   [id, ...],
+            'items' :   {id: {'id', 'label', 'url', 'parent', 'depth', 'children': [id, ...], 'breadcrumb': [id, ...]}},
+        }
+    '''
+    roots, items = [], {}
+
+    def walk(nodes, parent, breadcrumb):
+        ids = []
+        for node in nodes:
+            if node['id'] in items:
+                raise ValidationError('Duplicate menu item id "%(id)s"', params={'id': node['id']}, code='duplicate_id')
+
+            item = items[node['id']] = {
+                'id'            :   node['id'],
+                'label'         :   node['label'],
+                'url'           :   node.get('url'),
+                'parent'        :   parent,
+                'depth'         :   len(breadcrumb),
+                'breadcrumb'    :   breadcrumb + [node['id']],
+            }
+            item['children'] = walk(node.get('children', []), node['id'], item['breadcrumb'])
+            ids.append(node['id'])
+        return ids
+
+    roots = walk((menu or {}).get('navMenu', []), None, [])
+    return {'roots': roots, 'items': items}
+
+
+def flatten_stored(menu):
+    # A menu read back from the database, None when it no longer flattens
+    try:
+        return flatten(menu)
+    except (ValidationError, KeyError, TypeError):
+        return None
+
+
+def get_index(setting):
+    '''
+    setting.navigation_index, or the menu flattened now for rows saved before the index existed.
+    '''
+    if setting.navigation_index is not None or not setting.navigation_menu:
+        return setting.navigation_index
+    return flatten_stored(setting.navigation_menu)
+
+
+def breadcrumb(index, item_id):
+    # [item, ...] from the root down to item_id
+    items = index['items']
+    return [items[ancestor] for ancestor in items[item_id]['breadcrumb']] if item_id in items else []
+
+
+def render_items(index, ids):
+    if not ids:
+        return ''
+    items = index['items']
+    return format_html(
+        '<ul>{}</ul>',
+        format_html_join(
+            '', '<li data-id="{}" data-depth="{}"><a href="{}">{}</a>{}</li>',
+            (
+                (item['id'], item['depth'], item['url'] or '#', item['label'], render_items(index, item['children']))
+                for item in (items[item_id] for item_id in ids)
+            ),
+        ),
+    )
+
+
+def render(setting):
+    '''
+    The menu as nested <ul>, rendered from navigation_index and cached per row. SiteSetting.save() drops
+    every entry through the version; QuerySet.update() callers must call site_settings.invalidate() themselves.
+    '''
+    if setting is None:
+        return ''
+
+    cache   =   site_settings.get_cache()
+    key     =   site_settings.versioned_key(f'navigation:html:{setting.pk}')
+    html    =   cache.get(key)
+    if html is None:
+        index   =   get_index(setting)
+        html    =   render_items(index, index['roots']) if index else ''
+        cache.set(key, html, site_settings.SITE_SETTING_CACHE_TIMEOUT)
+    return mark_safe(html)
@@ -0,0 +1,191 @@
+import functools
+import inspect
+import time
+
+from django.conf                    import settings
+from django.contrib.auth.models     import Group, Permission
+from django.core.cache              import caches
+from django.db                      import connection
+
+# Signals
+from django.db.models.signals       import post_save, post_delete, m2m_changed
+from django.dispatch                import receiver
+
+# Tenant Users
+from tenant_users.permissions.backend       import UserBackend
+from tenant_users.permissions.functional    import tenant_cached_property
+from tenant_users.permissions.models        import UserTenantPermissions
+
+from web                                import caching
+
+
+# Permission cache settings, override in settings
+# PERMISSION_CACHE_TIMEOUT: seconds a user's permissions are kept, entries of older versions simply expire
+# Keys are namespaced by tenant through CACHES[...]['KEY_FUNCTION'], see web/caching.py.
+# A process local cache (LocMem, Dummy) would keep revoked permissions alive in the other workers,
+# permissions are then only kept for the request that loaded them.
+PERMISSION_CACHE_ALIAS      =   getattr(settings, 'PERMISSION_CACHE_ALIAS', 'default')
+PERMISSION_CACHE_TIMEOUT    =   getattr(settings, 'PERMISSION_CACHE_TIMEOUT', 60 * 60)
+
+VERSION_KEY                 =   'permissions:version'
+
+# tenant_cached_property values of the user model that prime() fills in
+PRIMED_PROPERTIES           =   ('tenant_perms', 'is_staff', 'is_superuser')
+
+
+def get_cache():
+    return caches[PERMISSION_CACHE_ALIAS]
+
+
+def get_version():
+    # Starts from the clock, so a version key dropped by the cache never brings old entries back
+    cache   =   get_cache()
+    version =   cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate():
+    '''
+    Orphans the cached permissions of every user of the current tenant.
+    '''
+    cache = get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def cache_key(user_id):
+    return f'permissions:{user_id}:{get_version()}'
+
+
+@functools.lru_cache(maxsize=None)
+def can_prime(user_class):
+    '''
+    Whether prime() can hand its values to `user_class`: its PRIMED_PROPERTIES must be tenant_cached_property,
+    which keeps them in instance.__dict__[schema][name] (tenant_users 1.2). Probed once per class against
+    the installed tenant_users, priming is skipped if that storage ever changes.
+    '''
+    if not all(isinstance(inspect.getattr_static(user_class, name, None), tenant_cached_property) for name in PRIMED_PROPERTIES):
+        return False
+
+    class Probe:
+        @tenant_cached_property
+        def value(self):
+            return 'computed'
+
+    probe = Probe()
+    probe.__dict__.setdefault(connection.schema_name, {})['value'] = 'primed'
+    return probe.value == 'primed'
+
+
+def permission_names(queryset):
+    return {f'{app_label}.{codename}' for app_label, codename in queryset.values_list('content_type__app_label', 'codename').order_by()}
+
+
+class CachedUserBackend(UserBackend):
+    '''
+    UserBackend reading a user's permissions from the shared cache, keyed by
+    (tenant schema, user id, permission version). A miss costs the same queries as UserBackend,
+    a hit none. The version of a schema is bumped by any Group, Permission or UserTenantPermissions change in it.
+    Without a shared cache the permissions are loaded once per request instead.
+    '''
+
+    def load(self, user_id):
+        '''
+        {'id', 'is_staff', 'is_superuser', 'user', 'group'} of the user in the current tenant, {} without UserTenantPermissions.
+        '''
+        row = UserTenantPermissions.objects.filter(profile_id=user_id).values('id', 'is_staff', 'is_superuser').first()
+        if row is None:
+            return {}
+
+        tenant_perms = UserTenantPermissions(**row, profile_id=user_id)
+        if tenant_perms.is_superuser:
+            row['user'] = row['group'] = permission_names(Permission.objects.all())
+        else:
+            row['user']     =   permission_names(self._get_user_permissions(tenant_perms))
+            row['group']    =   permission_names(self._get_group_permissions(tenant_perms))
+        return row
+
+    def get_snapshot(self, user_id):
+        if not caching.is_shared(PERMISSION_CACHE_ALIAS):
+            return self.load(user_id)
+
+        cache       =   get_cache()
+        key         =   cache_key(user_id)
+        snapshot    =   cache.get(key)
+        if snapshot is None:
+            snapshot = self.load(user_id)
+            cache.set(key, snapshot, PERMISSION_CACHE_TIMEOUT)
+        return snapshot
+
+    def _get_permissions(self, user_obj, obj, from_name):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+
+        perm_cache_name = f'_{from_name}_perm_cache'
+        if not hasattr(user_obj, perm_cache_name):
+            snapshot                    =   self.get_snapshot(user_obj.profile_id) or {'user': set(), 'group': set()}
+            user_obj._user_perm_cache   =   snapshot['user']
+            user_obj._group_perm_cache  =   snapshot['group']
+        return getattr(user_obj, perm_cache_name)
+
+    def prime(self, user):
+        '''
+        Hands `user` an in memory UserTenantPermissions for the current tenant, built from the snapshot,
+        so user.is_staff, user.has_perm() and friends run no query for the rest of the request.
+        '''
+        if not can_prime(type(user)):
+            return
+        snapshot = self.get_snapshot(user.pk)
+
+        values = user.__dict__.setdefault(connection.schema_name, {})
+        values['is_staff']      =   snapshot.get('is_staff', False)
+        values['is_superuser']  =   snapshot.get('is_superuser', False)
+        if snapshot:
+            tenant_perms                    =   UserTenantPermissions(id=snapshot['id'], is_staff=snapshot['is_staff'], is_superuser=snapshot['is_superuser'])
+            tenant_perms.profile            =   user
+            tenant_perms._user_perm_cache   =   snapshot['user']
+            tenant_perms._group_perm_cache  =   snapshot['group']
+            tenant_perms._perm_cache        =   {*snapshot['user'], *snapshot['group']}
+            values['tenant_perms']          =   tenant_perms
+
+
+# Middleware
+class PermissionCacheMiddleware:
+    '''
+    Loads the permissions of the authenticated user once per request, before any view asks for them.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response   =   get_response
+        self.backend        =   CachedUserBackend()
+
+    def __call__(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            # request.user is a SimpleLazyObject, the cache goes on the user it wraps
+            self.backend.prime(getattr(user, '_wrapped', user))
+        return self.get_response(request)
+
+
+# Invalidation
+@receiver(post_save, sender=UserTenantPermissions)
+@receiver(post_delete, sender=UserTenantPermissions)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+def invalidate_on_change(sender, raw=False, **kwargs):
+    if not raw:
+        caching.on_commit(invalidate)
+
+@receiver(m2m_changed, sender=UserTenantPermissions.groups.through)
+@receiver(m2m_changed, sender=UserTenantPermissions.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_on_m2m_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        caching.on_commit(invalidate)
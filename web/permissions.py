@@ -0,0 +1,150 @@
+from contextvars                        import ContextVar
+from contextlib                         import contextmanager
+
+from django.apps                        import apps
+from django.contrib.contenttypes.models import ContentType
+from django.db.models                   import Exists, OuterRef, Q
+
+# Signals
+from django.db.models.signals           import post_save, post_delete
+from django.dispatch                    import receiver, Signal
+
+
+# Fired whenever ObjectPermission rows are written or removed.
+# Bulk writers that bypass model signals must send it themselves.
+object_permissions_changed  =   Signal()
+
+# Per request cache of resolved grants
+# {(user_id, content_type_id, codename): {object_id: bool}}
+_permission_cache           =   ContextVar('object_permission_cache', default=None)
+
+
+@contextmanager
+def permission_cache():
+    '''
+    Scope a grant cache to the enclosed block (usually one request).
+    Outside of this block every lookup goes to the database.
+    '''
+    token = _permission_cache.set({})
+    try:
+        yield
+    finally:
+        _permission_cache.reset(token)
+
+
+def clear_permission_cache():
+    cache = _permission_cache.get()
+    if cache is not None:
+        cache.clear()
+
+
+def permission_grants(user, model, permission_codename):
+    '''
+    Subquery of object ids the user has been granted `permission_codename` on.
+    The permission is matched by join so no separate Permission lookup is needed.
+    '''
+    ObjectPermission    =   apps.get_model('web', 'ObjectPermission')
+    content_type        =   ContentType.objects.get_for_model(model)
+
+    return ObjectPermission.objects.filter(
+        user                        =   user,
+        content_type                =   content_type,
+        permission__content_type    =   content_type,
+        permission__codename        =   permission_codename,
+    )
+
+
+def filter_permitted(queryset, user, permission_codename):
+    '''
+    Narrow a CommonModel queryset to the rows the user may access.
+    Rows with has_object_permission=False are open to everyone, same as check_object_permission.
+    '''
+    grants = permission_grants(user, queryset.model, permission_codename).filter(object_id=OuterRef('pk'))
+
+    return queryset.filter(Q(has_object_permission=False) | Exists(grants))
+
+
+class PermissionResolver:
+    '''
+    Resolves object level permissions for one user.
+    Call prime() with the objects of a page/list to load all their grants in a single query,
+    subsequent has_object_permission() calls are then answered from the request cache.
+    '''
+
+    def __init__(self, user):
+        self.user       =   user
+        cache           =   _permission_cache.get()
+        self.cache      =   cache if cache is not None else {}
+
+    def _bucket(self, model, permission_codename):
+        content_type    =   ContentType.objects.get_for_model(model)
+        key             =   (self.user.pk, content_type.pk, permission_codename)
+        return self.cache.setdefault(key, {})
+
+    def prime(self, objects, permission_codename):
+        # Only records that opted into object permissions need a lookup
+        objects = [obj for obj in objects if obj.has_object_permission]
+        if not objects or not self.user.is_authenticated:
+            return
+
+        model   =   type(objects[0])
+        bucket  =   self._bucket(model, permission_codename)
+        missing =   {obj.pk for obj in objects if obj.pk not in bucket}
+        if not missing:
+            return
+
+        granted = set(
+            permission_grants(self.user, model, permission_codename)
+            .filter(object_id__in=missing)
+            .values_list('object_id', flat=True)
+        )
+        for object_id in missing:
+            bucket[object_id] = object_id in granted
+
+    def has_object_permission(self, obj, permission_codename):
+        if not obj.has_object_permission:
+            return True
+        if not self.user.is_authenticated:
+            return False
+
+        bucket = self._bucket(type(obj), permission_codename)
+        if obj.pk not in bucket:
+            bucket[obj.pk] = permission_grants(self.user, type(obj), permission_codename).filter(object_id=obj.pk).exists()
+
+        return bucket[obj.pk]
+
+    def permitted(self, objects, permission_codename):
+        objects = list(objects)
+        self.prime(objects, permission_codename)
+        return [obj for obj in objects if self.has_object_permission(obj, permission_codename)]
+
+
+# Middleware
+class ObjectPermissionCacheMiddleware:
+    '''
+    Gives every request its own grant cache so repeated checks on the same
+    (user, content type, codename) do not hit the database again.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with permission_cache():
+            return self.get_response(request)
+
+
+# Invalidation
+@receiver(object_permissions_changed)
+def _clear_on_change(sender, **kwargs):
+    clear_permission_cache()
+
+@receiver(post_save, sender='web.ObjectPermission')
+@receiver(post_delete, sender='web.ObjectPermission')
+def _object_permission_changed(sender, instance, **kwargs):
+    object_permissions_changed.send(
+        sender          =   sender,
+        user_ids        =   [instance.user_id],
+        content_type_id =   instance.content_type_id,
+        object_ids      =   [instance.object_id],
+    )
@@ -0,0 +1,71 @@
+import time
+
+from django.conf                    import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache              import caches
+
+# Signals
+from django.db.models.signals       import post_save, post_delete
+from django.dispatch                import receiver
+
+from web                            import caching
+from web.models                     import CommonModel
+from web.permissions                import object_permissions_changed
+
+
+# API response cache settings, override in settings
+# API_RESPONSE_CACHE_TIMEOUT: seconds a serialized list/detail body is kept, 0 disables the body cache (ETags still work)
+# Keys are namespaced by tenant through CACHES[...]['KEY_FUNCTION'], see web/caching.py
+API_RESPONSE_CACHE_ALIAS    =   getattr(settings, 'API_RESPONSE_CACHE_ALIAS', 'default')
+API_RESPONSE_CACHE_TIMEOUT  =   getattr(settings, 'API_RESPONSE_CACHE_TIMEOUT', 60)
+
+
+def get_cache():
+    return caches[API_RESPONSE_CACHE_ALIAS]
+
+
+def version_key(model):
+    return f'api:{model._meta.label_lower}:version'
+
+
+def table_version(model):
+    # Starts from the clock, so a version key dropped by the cache never brings old bodies back
+    cache   =   get_cache()
+    version =   cache.get(version_key(model))
+    if version is None:
+        cache.add(version_key(model), time.time_ns(), timeout=None)
+        version = cache.get(version_key(model))
+    return version
+
+
+def bump(model):
+    cache = get_cache()
+    try:
+        cache.incr(version_key(model))
+    except ValueError:
+        cache.set(version_key(model), time.time_ns(), timeout=None)
+
+
+def get_response(key):
+    return get_cache().get(f'api-response:{key}') if API_RESPONSE_CACHE_TIMEOUT else None
+
+
+def set_response(key, data):
+    if API_RESPONSE_CACHE_TIMEOUT:
+        get_cache().set(f'api-response:{key}', data, API_RESPONSE_CACHE_TIMEOUT)
+
+
+# Invalidation
+@receiver(post_save)
+@receiver(post_delete)
+def bump_on_change(sender, raw=False, **kwargs):
+    if not raw and issubclass(sender, CommonModel):
+        caching.on_commit(lambda: bump(sender))
+
+@receiver(object_permissions_changed)
+def bump_on_permission_change(sender, content_type_id=None, **kwargs):
+    # Grants decide which rows a user sees
+    if content_type_id is not None:
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        if model is not None:
+            caching.on_commit(lambda: bump(model))
@@ -0,0 +1,151 @@
+import functools
+import uuid
+
+from django.conf                    import settings
+from django.core.management         import call_command
+from django.db                      import connections, transaction, DatabaseError
+from django.db.migrations.executor  import MigrationExecutor
+
+# Django Tenants
+from django_tenants.clone           import CloneSchema
+from django_tenants.utils           import get_tenant_database_alias, schema_exists
+
+
+# Schema pool settings, override in settings
+# TENANT_SCHEMA_POOL_SIZE: how many migrated, unassigned schemas fill_schema_pool keeps ready
+# TENANT_TEMPLATE_SCHEMA : migrated schema that new pool schemas (or tenants, when the pool is empty) are cloned from
+TENANT_SCHEMA_POOL_PREFIX   =   getattr(settings, 'TENANT_SCHEMA_POOL_PREFIX', 'pool_')
+TENANT_SCHEMA_POOL_SIZE     =   getattr(settings, 'TENANT_SCHEMA_POOL_SIZE', 5)
+TENANT_TEMPLATE_SCHEMA      =   getattr(settings, 'TENANT_TEMPLATE_SCHEMA', 'tenant_template')
+
+# Order in which Startup.create_schema tries to get a schema
+PROVISIONING_STRATEGIES     =   ('pool', 'template', 'migrate')
+
+
+def get_connection():
+    return connections[get_tenant_database_alias()]
+
+
+def quote_schema(schema_name):
+    # connection.ops.quote_name() does not escape embedded double quotes, PostgreSQL doubles them
+    return '"%s"' % schema_name.replace('"', '""')
+
+
+def pool_schemas():
+    with get_connection().cursor() as cursor:
+        cursor.execute(
+            "SELECT nspname FROM pg_namespace WHERE nspname LIKE %s ORDER BY nspname",
+            [TENANT_SCHEMA_POOL_PREFIX.replace('_', r'\_') + '%'],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def migrate(schema_name, verbosity=0):
+    # Applies what is missing: everything for a new schema, usually nothing for a clone
+    call_command('migrate_schemas', tenant=True, schema_name=schema_name, interactive=False, verbosity=verbosity)
+    get_connection().set_schema_to_public()
+
+
+@functools.lru_cache(maxsize=None)
+def leaf_migrations():
+    '''
+    The leaf nodes of the migration graph this code ships, read once per process.
+    '''
+    return frozenset(MigrationExecutor(get_connection()).loader.graph.leaf_nodes())
+
+
+def applied_migrations(schema_name):
+    connection = get_connection()
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT app, name FROM {quote_schema(schema_name)}.django_migrations')
+        return set(cursor.fetchall())
+
+
+def is_current(schema_name):
+    # migrate_schemas records every app's migrations in a tenant schema, shared apps included
+    return leaf_migrations() <= applied_migrations(schema_name)
+
+
+def rename(old_name, new_name):
+    connection = get_connection()
+    with connection.cursor() as cursor:
+        cursor.execute(f'ALTER SCHEMA {quote_schema(old_name)} RENAME TO {quote_schema(new_name)}')
+
+
+# Provisioning
+def claim(schema_name, verbosity=0):
+    '''
+    Rename a pool schema to schema_name. Concurrent claims of the same pool schema block
+    on the rename, the loser gets an error for a schema that no longer exists and tries the next one.
+    A schema pooled before a deploy is migrated once it is ours, Startup.create_schema does not.
+    '''
+    for candidate in pool_schemas():
+        try:
+            with transaction.atomic(using=get_connection().alias):
+                rename(candidate, schema_name)
+        except DatabaseError:
+            continue
+        if not is_current(schema_name):
+            migrate(schema_name, verbosity)
+        return True
+    return False
+
+
+def clone_template(schema_name, verbosity=0):
+    if not schema_exists(TENANT_TEMPLATE_SCHEMA):
+        return False
+
+    CloneSchema().clone_schema(TENANT_TEMPLATE_SCHEMA, schema_name)
+    migrate(schema_name, verbosity)
+    return True
+
+
+def create_migrated(schema_name, verbosity=0):
+    connection = get_connection()
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE SCHEMA {quote_schema(schema_name)}')
+    migrate(schema_name, verbosity)
+    return True
+
+
+def provision(schema_name, strategies=PROVISIONING_STRATEGIES, verbosity=0):
+    '''
+    Create schema_name with the first strategy that works. Returns the strategy used.
+    '''
+    handlers = {
+        'pool'      :   lambda: claim(schema_name, verbosity),
+        'template'  :   lambda: clone_template(schema_name, verbosity),
+        'migrate'   :   lambda: create_migrated(schema_name, verbosity),
+    }
+    for strategy in strategies:
+        if handlers[strategy]():
+            return strategy
+    raise DatabaseError(f'Could not provision schema "{schema_name}"')
+
+
+# Pool maintenance
+def build_template(verbosity=0):
+    if schema_exists(TENANT_TEMPLATE_SCHEMA):
+        migrate(TENANT_TEMPLATE_SCHEMA, verbosity)
+    else:
+        create_migrated(TENANT_TEMPLATE_SCHEMA, verbosity)
+
+
+def fill_pool(size=TENANT_SCHEMA_POOL_SIZE, verbosity=0):
+    '''
+    Bring existing pool schemas up to date and create new ones until there are `size` of them.
+    Returns (migrated, created).
+    '''
+    existing = pool_schemas()
+    for schema_name in existing:
+        if not is_current(schema_name):
+            migrate(schema_name, verbosity)
+
+    created = []
+    for _ in range(max(0, size - len(existing))):
+        schema_name = f'{TENANT_SCHEMA_POOL_PREFIX}{uuid.uuid4().hex[:16]}'
+        if not clone_template(schema_name, verbosity):
+            create_migrated(schema_name, verbosity)
+        created.append(schema_name)
+
+    return existing, created
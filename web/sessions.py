@@ -0,0 +1,121 @@
+from django.conf                            import settings
+from django.contrib.sessions.backends       import cached_db
+from django.core.exceptions                 import SuspiciousOperation
+from django.db                              import connection
+from django.utils                           import timezone
+
+from web                                    import caching
+
+
+# Session engine settings, override in settings
+# SESSION_CLEANUP_BATCH_SIZE: rows deleted per DELETE by clearsessions, per tenant
+SESSION_CLEANUP_BATCH_SIZE  =   getattr(settings, 'SESSION_CLEANUP_BATCH_SIZE', 1000)
+
+KEY_PREFIX                  =   'tenant-session:'
+
+
+class SessionStore(cached_db.SessionStore):
+    '''
+    cached_db sessions of web.TenantSession, namespaced by the tenant schema in the cache and in the table:
+    a session key only opens a session on the tenant that created it. Cache keys get the schema from
+    web.caching.make_key, built for the schema the store was opened on.
+    Reads are served from SESSION_CACHE_ALIAS, the database is written through and only hit on a cache miss.
+    A save that would store the data that was loaded is skipped, unless SESSION_SAVE_EVERY_REQUEST asks
+    for the expiry to be pushed back on every request.
+    '''
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        # Taken now, SessionMiddleware saves in process_response
+        self.schema_name    =   getattr(connection, 'schema_name', 'public')
+        self._loaded        =   None
+        super().__init__(session_key)
+
+    @classmethod
+    def get_model_class(cls):
+        from web.models import TenantSession
+        return TenantSession
+
+    def key_for(self, session_key):
+        return f'{self.cache_key_prefix}{session_key}'
+
+    @property
+    def cache_key(self):
+        return self.key_for(self._get_or_create_session_key())
+
+    def serialized(self, data):
+        return self.serializer().dumps(data)
+
+    # Database, rows of this tenant only
+    def _get_session_from_db(self):
+        try:
+            return self.model.objects.get(session_key=self.session_key, schema_name=self.schema_name, expire_date__gt=timezone.now())
+        except (self.model.DoesNotExist, SuspiciousOperation):
+            self._session_key = None
+
+    def create_model_instance(self, data):
+        obj             =   super().create_model_instance(data)
+        obj.schema_name =   self.schema_name
+        return obj
+
+    # Cache
+    def load(self):
+        with caching.tenant_schema(self.schema_name):
+            data = super().load()
+        self._loaded = self.serialized(data)
+        return data
+
+    def exists(self, session_key):
+        # Session keys are the primary key, unique across tenants
+        if not session_key:
+            return False
+        with caching.tenant_schema(self.schema_name):
+            cached = self.key_for(session_key) in self._cache
+        return cached or self.model.objects.filter(session_key=session_key).exists()
+
+    def save(self, must_create=False):
+        unchanged = (
+            not must_create
+            and not settings.SESSION_SAVE_EVERY_REQUEST
+            and self.session_key is not None
+            and self._loaded is not None
+            and self.serialized(self._get_session(no_load=True)) == self._loaded
+        )
+        if unchanged:
+            return
+        with caching.tenant_schema(self.schema_name):
+            super().save(must_create)
+        self._loaded = self.serialized(self._session)
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self.model.objects.filter(session_key=session_key, schema_name=self.schema_name).delete()
+        with caching.tenant_schema(self.schema_name):
+            self._cache.delete(self.key_for(session_key))
+
+    @classmethod
+    def clear_expired(cls, batch_size=SESSION_CLEANUP_BATCH_SIZE):
+        '''
+        Deletes expired rows tenant by tenant, `batch_size` rows per DELETE, so clearsessions
+        never holds locks on a large part of the table. Their cache entries expire on their own.
+        '''
+        model   =   cls.get_model_class()
+        now     =   timezone.now()
+        schemas =   model.objects.filter(expire_date__lt=now).values_list('schema_name', flat=True).distinct().order_by()
+        table   =   connection.ops.quote_name(model._meta.db_table)
+
+        # Plain SQL, QuerySet.delete() would SELECT each batch first to send post_delete
+        sql = f'''
+            DELETE FROM {table} WHERE session_key IN (
+                SELECT session_key FROM {table} WHERE schema_name = %s AND expire_date < %s LIMIT %s
+            )
+        '''
+        for schema_name in list(schemas):
+            deleted = batch_size
+            while deleted == batch_size:
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, [schema_name, now, batch_size])
+                    deleted = cursor.rowcount
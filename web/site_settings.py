@@ -0,0 +1,60 @@
+import time
+
+from django.conf                    import settings
+from django.core.cache              import caches
+
+from web                            import caching
+
+
+# SiteSetting cache settings, override in settings
+# Keys are namespaced by tenant through CACHES[...]['KEY_FUNCTION'], see web/caching.py
+SITE_SETTING_CACHE_ALIAS    =   getattr(settings, 'SITE_SETTING_CACHE_ALIAS', 'default')
+SITE_SETTING_CACHE_TIMEOUT  =   getattr(settings, 'SITE_SETTING_CACHE_TIMEOUT', 60 * 60)
+
+# Shared by every tenant: web is a shared app, they all read the one SiteSetting table of the public schema
+VERSION_KEY                 =   f'{caching.GLOBAL_PREFIX}site-setting:version'
+
+
+def get_cache():
+    return caches[SITE_SETTING_CACHE_ALIAS]
+
+
+def get_version():
+    # Starts from the clock, so a version key dropped by the cache never brings old entries back
+    cache   =   get_cache()
+    version =   cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate():
+    '''
+    Orphans every cached SiteSetting of every tenant, whatever fields were loaded.
+    '''
+    cache = get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def versioned_key(name):
+    # Anything derived from SiteSetting, dropped together with it by invalidate()
+    return f'site-setting:{get_version()}:{name}'
+
+
+@caching.tenant_cached(timeout=SITE_SETTING_CACHE_TIMEOUT, alias=SITE_SETTING_CACHE_ALIAS)
+def load(model, fields, version):
+    queryset = model.objects.order_by('pk')
+    queryset = queryset.only(*fields) if fields else queryset.defer(*model.lazy_fields)
+    return queryset.first()
+
+
+def get_current(model, fields=()):
+    '''
+    The tenant's SiteSetting, cached. With `fields` only those columns are loaded, without them
+    everything but model.lazy_fields is (those are read from the database on first access).
+    '''
+    return load(model, tuple(sorted(fields)), get_version())
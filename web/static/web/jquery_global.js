@@ -0,0 +1,2 @@
+/* Expose the jQuery bundled with the admin as $/jQuery for admin_meta Media scripts */
+window.jQuery = window.$ = django.jQuery;
@@ -0,0 +1,53 @@
+/*
+ * Initializes every JsonEditorWidget on the page (web/widget.py), this file is loaded once through the widget's Media.
+ * Each widget renders a hidden <textarea data-json-editor="<schema element id>" data-json-editor-src="<json-editor url>">
+ * and its schema as json_script.
+ *
+ * json-editor and the django-jsoneditor widget both define window.JSONEditor. Their inline scripts run while the
+ * page is parsed, so json-editor is only loaded afterwards, once, and the global is handed back right away.
+ */
+(function () {
+    'use strict';
+
+    function load(src, callback) {
+        var previous    = window.JSONEditor;
+        var script      = document.createElement('script');
+
+        script.src      = src;
+        script.onload   = function () {
+            var SchemaEditor = window.JSONEditor;
+            window.JSONEditor = previous;
+            callback(SchemaEditor);
+        };
+        document.head.appendChild(script);
+    }
+
+    function init(SchemaEditor, textarea) {
+        var schema  = JSON.parse(document.getElementById(textarea.dataset.jsonEditor).textContent);
+        var holder  = document.createElement('div');
+        var editor;
+
+        textarea.parentNode.insertBefore(holder, textarea.nextSibling);
+        editor = new SchemaEditor(holder, {
+            schema      : schema,
+            startval    : textarea.value ? JSON.parse(textarea.value) : {},
+            theme       : 'html',
+            iconlib     : 'fontawesome5',
+        });
+        editor.on('change', function () {
+            textarea.value = JSON.stringify(editor.getValue());
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        var textareas = document.querySelectorAll('textarea[data-json-editor]');
+        if (!textareas.length) {
+            return;
+        }
+        load(textareas[0].dataset.jsonEditorSrc, function (SchemaEditor) {
+            textareas.forEach(function (textarea) {
+                init(SchemaEditor, textarea);
+            });
+        });
+    });
+})();
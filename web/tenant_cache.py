@@ -0,0 +1,126 @@
+import copy
+import threading
+import time
+from collections                    import OrderedDict
+
+from django.conf                    import settings
+from django.core.cache              import caches
+from django.db                      import transaction
+
+# Signals
+from django.db.models.signals       import post_save, post_delete
+from django.dispatch                import receiver
+
+# Django Tenants
+from django_tenants.middleware.main import TenantMainMiddleware
+
+
+# Tenant resolution cache settings, override in settings
+# TENANT_CACHE_SHARED_ALIAS: a CACHES alias shared by all workers, None keeps the cache process local
+# (Domain/Startup changes then only reach the worker that made them, check web.E002)
+TENANT_CACHE_SIZE           =   getattr(settings, 'TENANT_CACHE_SIZE', 10000)
+TENANT_CACHE_TTL            =   getattr(settings, 'TENANT_CACHE_TTL', 300)
+TENANT_CACHE_NEGATIVE_TTL   =   getattr(settings, 'TENANT_CACHE_NEGATIVE_TTL', 30)
+TENANT_CACHE_SHARED_ALIAS   =   getattr(settings, 'TENANT_CACHE_SHARED_ALIAS', 'default')
+
+# Resolved before any tenant is active, the key is shared by all of them (web/caching.py)
+GENERATION_KEY              =   'global:tenant-resolution:generation'
+MISSING                     =   object()
+
+
+class TenantCache:
+    '''
+    hostname -> tenant, LRU with a TTL per entry. Unknown hosts are cached too (shorter TTL).
+    With a shared cache every worker compares a generation counter on lookup,
+    so an invalidation in one process empties the local cache of all of them.
+    '''
+
+    def __init__(self, size=TENANT_CACHE_SIZE, ttl=TENANT_CACHE_TTL, negative_ttl=TENANT_CACHE_NEGATIVE_TTL, shared_alias=TENANT_CACHE_SHARED_ALIAS):
+        self.size           =   size
+        self.ttl            =   ttl
+        self.negative_ttl   =   negative_ttl
+        self.shared_alias   =   shared_alias
+        self.entries        =   OrderedDict()
+        self.generation     =   None
+        self.lock           =   threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias] if self.shared_alias else None
+
+    def sync_generation(self):
+        if self.shared is None:
+            return
+        generation = self.shared.get(GENERATION_KEY)
+        if generation is None:
+            generation = self.shared.get_or_set(GENERATION_KEY, 1, timeout=None)
+        if generation != self.generation:
+            with self.lock:
+                self.entries.clear()
+                self.generation = generation
+
+    def get(self, hostname):
+        self.sync_generation()
+        with self.lock:
+            entry = self.entries.get(hostname)
+            if entry is None:
+                return None
+            tenant, expires = entry
+            if expires < time.monotonic():
+                del self.entries[hostname]
+                return None
+            self.entries.move_to_end(hostname)
+            return tenant
+
+    def set(self, hostname, tenant):
+        ttl = self.negative_ttl if tenant is MISSING else self.ttl
+        with self.lock:
+            self.entries[hostname] = (tenant, time.monotonic() + ttl)
+            self.entries.move_to_end(hostname)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self):
+        with self.lock:
+            self.entries.clear()
+        if self.shared is not None:
+            try:
+                self.generation = self.shared.incr(GENERATION_KEY)
+            except ValueError:
+                self.shared.set(GENERATION_KEY, 1, timeout=None)
+
+
+tenant_cache = TenantCache()
+
+
+class CachedTenantMainMiddleware(TenantMainMiddleware):
+    '''
+    TenantMainMiddleware that resolves the hostname from tenant_cache before going to web.Domain.
+    '''
+
+    def get_tenant(self, domain_model, hostname):
+        tenant = tenant_cache.get(hostname)
+
+        if tenant is None:
+            try:
+                tenant = super().get_tenant(domain_model, hostname)
+            except domain_model.DoesNotExist:
+                tenant_cache.set(hostname, MISSING)
+                raise
+            tenant_cache.set(hostname, tenant)
+
+        if tenant is MISSING:
+            raise domain_model.DoesNotExist(f'No tenant for hostname "{hostname}"')
+
+        # Every request gets its own instance, process_request sets attributes on it
+        return copy.copy(tenant)
+
+
+# Invalidation
+@receiver(post_save, sender='web.Domain')
+@receiver(post_delete, sender='web.Domain')
+@receiver(post_save, sender='web.Startup')
+@receiver(post_delete, sender='web.Startup')
+def invalidate_tenant_cache(sender, **kwargs):
+    # After commit, so a request running in between cannot cache the old row again
+    transaction.on_commit(tenant_cache.invalidate)
@@ -1,3 +1,739 @@
-from django.test import TestCase
+import datetime
+import hashlib
+import io
+import json
+import os
+import tempfile
+from unittest                       import mock
 
-# Create your tests here.
+from django.conf                    import settings
+from django.contrib                 import admin
+from django.contrib.auth.models     import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache              import caches
+from django.core.exceptions         import ValidationError
+from django.core.files.base         import ContentFile
+from django.core.management         import call_command
+from django.db                      import connection
+from django.test                    import override_settings
+from django.test.utils              import CaptureQueriesContext
+from django.utils                   import timezone
+
+# Django Tenants
+from django_tenants.test.cases      import TenantTestCase
+from django_tenants.test.client     import TenantClient
+
+# Tenant Users
+from tenant_users.permissions.models import UserTenantPermissions
+
+from users.models                   import TenantUser
+from web                            import admin as admin_module, caching, json_schema, navigation, permission_backend, response_cache, schema_pool, site_settings, tenant_cache, thumbnails, views
+from web.admin                      import get_admin_meta
+from web.models                     import Domain, FileMaster, ImageMaster, ObjectPermission, SiteSetting, Startup, TenantSession
+from web.permissions                import PermissionResolver
+from web.sessions                   import SessionStore
+from web.uploads                    import UploadSession
+
+
+ADMIN_URL = '/uzumymw/'
+
+
+# Admin pages render without a collectstatic manifest
+STORAGES = {
+    'default'       :   {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles'   :   {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+class WebTestCase(TenantTestCase):
+    '''
+    TenantTestCase with a Startup tenant and a staff user of it, logged in on self.client.
+    '''
+
+    @classmethod
+    def setup_tenant(cls, tenant):
+        tenant.name         =   'Test'
+        tenant.paid_until   =   datetime.date(2100, 1, 1)
+        tenant.on_trial     =   False
+        tenant.owner, _     =   TenantUser.objects.get_or_create(email='owner@test.com', defaults={'is_active': True})
+
+    def setUp(self):
+        super().setUp()
+        # TenantTestCase.setUpClass does not apply class level override_settings
+        self.enterContext(override_settings(STORAGES=STORAGES))
+
+        self.user           =   TenantUser.objects.create(email='staff@test.com', is_active=True)
+        self.tenant_perms   =   UserTenantPermissions.objects.create(profile=self.user, is_staff=True)
+        self.group          =   Group.objects.create(name='editors')
+        self.group.permissions.set(Permission.objects.filter(codename__in=['view_filemaster', 'change_filemaster']))
+        self.tenant_perms.groups.add(self.group)
+
+        self.client = TenantClient(self.tenant)
+        self.client.force_login(self.user)
+
+    def queries(self, url):
+        '''
+        SQL run by GET url, without django_tenants' SET search_path.
+        '''
+        with CaptureQueriesContext(connection) as queries:
+            self.response = self.client.get(url)
+        return [query['sql'] for query in queries.captured_queries if not query['sql'].startswith('SET search_path')]
+
+    def permission_queries(self, url):
+        return [sql for sql in self.queries(url) if 'permission' in sql.lower()]
+
+
+# Permission cache (web/permission_backend.py)
+# The test process is the only worker, its local memory cache stands in for a shared one
+class PermissionCacheTests(WebTestCase):
+
+    def test_shared_cache_serves_repeat_requests_without_permission_queries(self):
+        with mock.patch('web.caching.is_shared', return_value=True):
+            self.client.get(ADMIN_URL)
+            self.assertEqual(self.permission_queries(ADMIN_URL), [])
+
+            permission_backend.invalidate()
+            self.assertEqual(len(self.permission_queries(ADMIN_URL)), 3)
+
+    def test_local_cache_loads_permissions_once_per_request(self):
+        with mock.patch('web.caching.is_shared', return_value=False):
+            self.client.get(ADMIN_URL)
+            self.assertEqual(len(self.permission_queries(ADMIN_URL)), 3)
+
+    def test_revoke_applies_to_the_next_request(self):
+        with mock.patch('web.caching.is_shared', return_value=True):
+            self.assertEqual(self.client.get(f'{ADMIN_URL}web/filemaster/').status_code, 200)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.tenant_perms.groups.clear()
+            self.assertEqual(self.client.get(f'{ADMIN_URL}web/filemaster/').status_code, 403)
+
+    def test_prime_matches_tenant_cached_property(self):
+        self.assertTrue(permission_backend.can_prime(TenantUser))
+
+
+# Precomputed admin meta (web/admin.py)
+class AdminMetaTests(WebTestCase):
+
+    def test_admin_meta_is_built_once_per_model(self):
+        filemaster = FileMaster.objects.create(name='report', file='file_master/report.pdf')
+        get_admin_meta(FileMaster)
+
+        with mock.patch('web.admin.build_admin_meta', wraps=admin_module.build_admin_meta) as build:
+            for _ in range(2):
+                self.assertEqual(self.client.get(f'{ADMIN_URL}web/filemaster/').status_code, 200)
+                self.assertEqual(self.client.get(f'{ADMIN_URL}web/filemaster/{filemaster.pk}/change/').status_code, 200)
+            # A second admin of the model reuses it too
+            admin_module.GenericAdmin(FileMaster, admin.site)
+
+        build.assert_not_called()
+        self.assertIs(admin.site._registry[FileMaster].meta, get_admin_meta(FileMaster))
+
+
+# Changelist query planning (web/admin.py)
+class ChangelistQueryTests(WebTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tenant_perms.is_superuser = True
+        self.tenant_perms.save()
+
+    def add_rows(self, model, count, **values):
+        for number in range(count):
+            model.objects.create(**{name: value.format(number) if isinstance(value, str) else value for name, value in values.items()})
+
+    def assert_constant_queries(self, url, add_rows):
+        '''
+        The changelist runs as many queries with more rows on the page.
+        '''
+        add_rows(2)
+        self.client.get(url)
+        baseline = len(self.queries(url)) + self.queries_search_path
+
+        add_rows(5)
+        with self.assertNumQueries(baseline):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.queries_search_path = sum(query['sql'].startswith('SET search_path') for query in queries.captured_queries)
+        return [query['sql'] for query in queries.captured_queries if not query['sql'].startswith('SET search_path')]
+
+    def test_foreign_keys_in_list_display_are_joined(self):
+        self.assertIn('created_by', admin.site._registry[FileMaster].list_select_related)
+        self.assert_constant_queries(
+            f'{ADMIN_URL}web/filemaster/',
+            lambda count: self.add_rows(FileMaster, count, name='file {}', file='file_master/{}.pdf', created_by=self.user, updated_by=self.user),
+        )
+
+    def test_to_many_relations_in_list_display_are_prefetched(self):
+        with mock.patch.object(Startup, 'admin_meta', {'list_display': ['name', 'domains']}, create=True), \
+             mock.patch.dict(admin_module._admin_meta_cache, clear=True):
+            meta = get_admin_meta(Startup)
+        self.assertEqual(meta.prefetch_related, ('domains',))
+        self.assertTrue(callable(meta.list_display[1]))
+
+        def add_rows(count):
+            # bulk_create, TenantMixin.save() creates schemas and only runs on the public schema
+            first       =   Startup.objects.count()
+            startups    =   Startup.objects.bulk_create(
+                Startup(schema_name=f'startup{number}', name='Startup', paid_until=self.tenant.paid_until, on_trial=False, owner=self.tenant.owner)
+                for number in range(first, first + count)
+            )
+            Domain.objects.bulk_create(Domain(tenant=startup, domain=f'{startup.schema_name}.test.com') for startup in startups)
+
+        # The admin site's URLs are bound to the registered admin, it gets the new meta
+        with mock.patch.multiple(admin.site._registry[Startup], meta=meta, list_display=meta.list_display):
+            self.assert_constant_queries(f'{ADMIN_URL}web/startup/', add_rows)
+            self.assertContains(self.client.get(f'{ADMIN_URL}web/startup/'), self.domain.domain)
+
+    def test_query_budget_is_enforced(self):
+        self.add_rows(FileMaster, 3, name='file {}', file='file_master/{}.pdf')
+        url         =   f'{ADMIN_URL}web/filemaster/'
+        model_admin =   admin.site._registry[FileMaster]
+
+        with mock.patch.object(model_admin, 'changelist_query_budget', 50, create=True):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        with mock.patch.object(model_admin, 'changelist_query_budget', 2, create=True):
+            with self.assertRaises(admin_module.QueryBudgetExceeded):
+                self.client.get(url)
+
+
+# JSON schema validation (web/models.py, web/json_schema.py)
+class JSONFieldValidationTests(WebTestCase):
+
+    menu = {'navMenu': [{'id': 'home', 'label': 'Home', 'url': '/'}]}
+
+    def test_admin_save_validates_once(self):
+        self.tenant_perms.is_superuser = True
+        self.tenant_perms.save()
+
+        with mock.patch('web.json_schema.validate_instance', wraps=json_schema.validate_instance) as validate, \
+             mock.patch('web.navigation.flatten', wraps=navigation.flatten) as flatten:
+            response = self.client.post(f'{ADMIN_URL}web/sitesetting/add/', {'navigation_menu': json.dumps(self.menu)})
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(validate.call_count, 1)
+        self.assertEqual(flatten.call_count, 1)
+        self.assertEqual(SiteSetting.objects.get().navigation_index['roots'], ['home'])
+
+    def test_save_without_full_clean_validates(self):
+        with self.assertRaises(ValidationError):
+            SiteSetting(navigation_menu={'navMenu': [{'id': 1}]}).save()
+
+    def test_api_rejects_invalid_json_with_400(self):
+        self.tenant_perms.is_superuser = True
+        self.tenant_perms.save()
+
+        response = self.client.post('/api/sitesetting/', {'navigation_menu': {'navMenu': [{'id': 1}]}}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('navigation_menu', response.json())
+        self.assertFalse(SiteSetting.objects.exists())
+
+        response = self.client.post('/api/sitesetting/', {'navigation_menu': self.menu}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+
+# Conditional API reads (web/api.py, web/response_cache.py)
+class ConditionalReadTests(WebTestCase):
+
+    def test_thumbnails_change_the_etag(self):
+        self.tenant_perms.is_superuser = True
+        self.tenant_perms.save()
+        image   =   ImageMaster.objects.create(name='logo', image='image_master/logo.png')
+        url     =   f'/api/imagemaster/{image.pk}/'
+        etag    =   self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Renditions are stored with update(), no post_save
+        renditions = {'source': image.image.name, 'WEBP': {'path': 'thumbnails/logo_200x200.webp', 'width': 200, 'height': 200}}
+        with mock.patch('web.thumbnails.render', return_value=renditions), self.captureOnCommitCallbacks(execute=True):
+            thumbnails.generate(ImageMaster, image.pk)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['renditions'], renditions)
+
+
+# Batch requests (web/views.py)
+class BatchTests(WebTestCase):
+
+    token = 'a' * 32
+
+    def setUp(self):
+        super().setUp()
+        self.client = TenantClient(self.tenant, enforce_csrf_checks=True)
+        self.client.force_login(self.user)
+
+    def batch(self, *specs, **headers):
+        return self.client.post('/api/batch/', {'requests': list(specs)}, content_type='application/json', **headers)
+
+    def test_unsafe_entries_need_the_csrf_token(self):
+        entry = {'method': 'DELETE', 'path': '/api/uploads/missing/'}
+        self.assertEqual(self.batch(entry).status_code, 403)
+
+        self.client.cookies['csrftoken'] = self.token
+        response = self.batch(entry, HTTP_X_CSRFTOKEN=self.token)
+        self.assertEqual(response.status_code, 200)
+        # Reaches the upload view, which needs add_filemaster
+        self.assertEqual(response.json()['responses'][0]['status'], 403)
+
+    def test_anonymous_batches_are_rejected(self):
+        self.client.logout()
+        self.client.cookies['csrftoken'] = self.token
+        self.assertEqual(self.batch({'path': '/api/filemaster/'}, HTTP_X_CSRFTOKEN=self.token).status_code, 401)
+
+
+# Tenant sessions (web/sessions.py)
+class TenantSessionTests(WebTestCase):
+
+    def test_sessions_are_not_in_the_admin(self):
+        self.assertNotIn(TenantSession, admin.site._registry)
+        self.assertEqual(self.client.get(f'{ADMIN_URL}web/tenantsession/').status_code, 404)
+
+    def test_cache_keys_carry_the_schema_once(self):
+        store = SessionStore()
+        store['value'] = 1
+        store.save()
+
+        key = caches[settings.SESSION_CACHE_ALIAS].make_key(store.cache_key)
+        self.assertEqual(key.split(':').count(self.tenant.schema_name), 1)
+        self.assertEqual(SessionStore(store.session_key)['value'], 1)
+
+        # Opened on another schema, the key reaches another entry
+        with caching.tenant_schema('public'):
+            self.assertNotEqual(caches[settings.SESSION_CACHE_ALIAS].make_key(store.cache_key), key)
+
+
+# Cached site settings (web/site_settings.py)
+class SiteSettingTests(WebTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.setting = SiteSetting.objects.create(email='old@test.com')
+
+    def save(self, **values):
+        for name, value in values.items():
+            setattr(self.setting, name, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.setting.save()
+
+    def test_save_invalidates_get_current(self):
+        self.assertEqual(SiteSetting.get_current().email, 'old@test.com')
+        with self.assertNumQueries(0):
+            SiteSetting.get_current()
+
+        self.save(email='new@test.com')
+        self.assertEqual(SiteSetting.get_current().email, 'new@test.com')
+        self.assertEqual(SiteSetting.get_current('email').email, 'new@test.com')
+
+    def test_save_reaches_the_other_tenants(self):
+        # One SiteSetting table in the public schema, read by every tenant
+        connection.set_schema_to_public()
+        try:
+            self.assertEqual(SiteSetting.get_current().email, 'old@test.com')
+        finally:
+            connection.set_tenant(self.tenant)
+
+        self.save(email='new@test.com')
+
+        connection.set_schema_to_public()
+        try:
+            self.assertEqual(SiteSetting.get_current().email, 'new@test.com')
+        finally:
+            connection.set_tenant(self.tenant)
+
+
+# Schema provisioning (web/schema_pool.py)
+class SchemaProvisioningTests(WebTestCase):
+
+    def test_invalid_schema_names_are_rejected(self):
+        for name in ('', 'pg_catalog', 'x' * 64):
+            startup = Startup(schema_name=name, name='Startup', paid_until=self.tenant.paid_until, on_trial=False, owner=self.tenant.owner)
+            with self.subTest(name=name), mock.patch('web.schema_pool.provision') as provision:
+                with self.assertRaises(ValidationError):
+                    startup.create_schema()
+                provision.assert_not_called()
+
+    def test_quotes_in_schema_names_stay_in_the_identifier(self):
+        name = 'evil"; DROP SCHEMA public CASCADE; --'
+        with connection.cursor() as cursor:
+            cursor.execute(f'CREATE SCHEMA {schema_pool.quote_schema(name)}')
+            cursor.execute('SELECT count(*) FROM pg_namespace WHERE nspname = %s', [name])
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+
+# History retention (web/management/commands/prune_history.py)
+class PruneHistoryTests(WebTestCase):
+
+    retention = {'days': 30, 'versions': 2}
+
+    def setUp(self):
+        super().setUp()
+        now             =   timezone.now()
+        self.recent     =   FileMaster.objects.create(name='recent', file='file_master/recent.pdf')
+        self.old        =   FileMaster.objects.create(name='old', file='file_master/old.pdf')
+        FileMaster.history.all().delete()
+        # 5 recent versions of one file, 1 old version of the other
+        for day in range(5):
+            FileMaster.history.bulk_history_create([self.recent], default_date=now - datetime.timedelta(days=day))
+        FileMaster.history.bulk_history_create([self.old], default_date=now - datetime.timedelta(days=60))
+
+    def prune(self, **options):
+        with mock.patch.object(FileMaster, 'admin_meta', {**FileMaster.admin_meta, 'history_retention': self.retention}):
+            call_command('prune_history', schemas=['public'], stdout=io.StringIO(), **options)
+
+    def test_old_and_surplus_versions_are_deleted_in_batches(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.prune(batch_size=2)
+
+        # The union of both rules, each row once: the 3 oldest versions of one file and the old file
+        self.assertEqual(FileMaster.history.filter(id=self.recent.pk).count(), 2)
+        self.assertFalse(FileMaster.history.filter(id=self.old.pk).exists())
+        selects = [query['sql'] for query in queries.captured_queries if 'ROW_NUMBER' in query['sql']]
+        self.assertTrue(selects and all('LIMIT 2' in sql for sql in selects))
+        self.assertEqual(sum(query['sql'].startswith('DELETE') for query in queries.captured_queries), 2)
+
+    def test_dry_run_deletes_nothing(self):
+        out = io.StringIO()
+        with mock.patch.object(FileMaster, 'admin_meta', {**FileMaster.admin_meta, 'history_retention': self.retention}):
+            call_command('prune_history', schemas=['public'], dry_run=True, stdout=out)
+        self.assertEqual(FileMaster.history.count(), 6)
+        self.assertIn('4 rows', out.getvalue())
+
+
+# Tenant resolution cache (web/tenant_cache.py)
+class TenantCacheTests(WebTestCase):
+
+    def test_invalidation_reaches_the_other_workers(self):
+        # Two processes' caches, sharing CACHES['default'] as they do by default
+        worker, other = tenant_cache.TenantCache(), tenant_cache.TenantCache()
+        # A miss first, as in the middleware
+        self.assertIsNone(other.get('gone.test.com'))
+        other.set('gone.test.com', self.tenant)
+        self.assertIs(other.get('gone.test.com'), self.tenant)
+
+        worker.invalidate()
+        self.assertIsNone(other.get('gone.test.com'))
+
+    def test_process_local_resolution_is_reported(self):
+        with mock.patch('web.caching.is_shared', return_value=True):
+            self.assertEqual(caching.check_shared_caches(None), [])
+            with mock.patch('web.tenant_cache.TENANT_CACHE_SHARED_ALIAS', None):
+                self.assertEqual([error.id for error in caching.check_shared_caches(None)], ['web.E002'])
+
+
+# Navigation menu (web/navigation.py)
+class NavigationTests(WebTestCase):
+
+    menu = {'navMenu': [
+        {'id': 'home', 'label': 'Home', 'url': '/'},
+        {'id': 'about', 'label': 'About', 'children': [
+            {'id': 'team', 'label': 'Team', 'url': '/about/team/', 'children': [{'id': 'jobs', 'label': 'Jobs', 'url': '/jobs/'}]},
+        ]},
+    ]}
+
+    def setUp(self):
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.setting = SiteSetting.objects.create(navigation_menu=self.menu)
+
+    def test_breadcrumb(self):
+        self.assertEqual([item['id'] for item in self.setting.navigation_breadcrumb('jobs')], ['about', 'team', 'jobs'])
+        self.assertEqual([item['id'] for item in self.setting.navigation_breadcrumb('home')], ['home'])
+        self.assertEqual(self.setting.navigation_breadcrumb('missing'), [])
+
+    def test_render_uses_the_stored_index_and_the_cache(self):
+        with mock.patch('web.navigation.flatten') as flatten:
+            html = self.setting.render_navigation()
+            self.assertEqual(self.setting.render_navigation(), html)
+        flatten.assert_not_called()
+        self.assertInHTML('<li data-id="jobs" data-depth="2"><a href="/jobs/">Jobs</a></li>', html)
+        self.assertIn('href="#"', html)
+
+    def test_save_renders_the_new_menu(self):
+        self.setting.render_navigation()
+        self.setting.navigation_menu = {'navMenu': [{'id': 'blog', 'label': 'Blog', 'url': '/blog/'}]}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.setting.save()
+        html = SiteSetting.objects.get().render_navigation()
+        self.assertIn('Blog', html)
+        self.assertNotIn('Home', html)
+
+    def test_rows_saved_before_the_index_are_flattened(self):
+        SiteSetting.objects.update(navigation_index=None)
+        site_settings.invalidate()
+        self.assertIn('Team', SiteSetting.objects.get().render_navigation())
+
+
+# Admin actions (web/actions.py)
+class ActionTests(WebTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tenant_perms.is_superuser = True
+        self.tenant_perms.save()
+        self.files = [FileMaster.objects.create(name=f'file {number}', file=f'file_master/{number}.pdf', has_object_permission=True) for number in range(3)]
+
+    def run_action(self, action):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f'{ADMIN_URL}web/filemaster/', {'action': action, '_selected_action': [obj.pk for obj in self.files]})
+
+    def test_bypass_permissions_invalidates_like_a_save(self):
+        # update() sends no post_save, the API version and the request grant cache must move anyway
+        with mock.patch.object(admin.site._registry[FileMaster], 'action_chunk_size', 2, create=True), \
+             mock.patch('web.response_cache.bump', wraps=response_cache.bump) as bump, \
+             mock.patch('web.permissions.clear_permission_cache') as clear:
+            self.assertEqual(self.run_action('bypass_permissions').status_code, 302)
+
+        self.assertFalse(FileMaster.objects.filter(has_object_permission=True).exists())
+        # Once per chunk of primary keys
+        self.assertEqual(bump.call_count, 2)
+        self.assertEqual(clear.call_count, 2)
+        bump.assert_called_with(FileMaster)
+
+
+# Generated serializers (web/api.py)
+class SerializerTests(WebTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.tenant_perms.is_superuser = True
+        self.tenant_perms.save()
+        self.image  =   ImageMaster.objects.create(name='logo', image='image_master/logo.png')
+        self.file   =   FileMaster.objects.create(name='report', file='file_master/report.pdf')
+
+    def test_url_properties_are_serialized(self):
+        image = self.client.get(f'/api/imagemaster/{self.image.pk}/').json()
+        self.assertEqual(image['thumbnail_url'], self.image.thumbnail_url)
+        self.assertEqual(image['media_url'], self.image.media_url)
+        self.assertEqual(self.client.get(f'/api/filemaster/{self.file.pk}/').json()['media_url'], self.file.media_url)
+
+    def test_url_properties_can_be_requested_alone(self):
+        ImageMaster.objects.create(name='banner', image='image_master/banner.png')
+        queries = [sql for sql in self.queries('/api/imagemaster/?fields=id,thumbnail_url') if 'FROM "web_imagemaster"' in sql]
+
+        # The columns thumbnail_url reads are selected with the page, not loaded row by row
+        self.assertEqual(len(queries), 2)
+        self.assertIn('"web_imagemaster"."renditions"', queries[1])
+        self.assertEqual(set(self.response.json()['results'][0]), {'id', 'thumbnail_url'})
+
+
+# Object permissions (web/models.py ObjectPermissionManager, web/permissions.py)
+class ObjectPermissionTests(WebTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.other      =   TenantUser.objects.create(email='other@test.com', is_active=True)
+        self.view       =   Permission.objects.get(codename='view_filemaster')
+        self.files      =   [FileMaster.objects.create(name=f'file {number}', file=f'file_master/{number}.pdf', has_object_permission=True) for number in range(3)]
+        self.open_file  =   FileMaster.objects.create(name='open', file='file_master/open.pdf')
+
+    def sql(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        return [query['sql'] for query in queries.captured_queries if not query['sql'].startswith('SET search_path')]
+
+    def grants(self):
+        return ObjectPermission.objects.filter(permission=self.view).count()
+
+    def test_grant_bulk_is_idempotent(self):
+        self.assertEqual(ObjectPermission.objects.grant_bulk([self.user, self.other], self.view, self.files), 6)
+        self.assertEqual(self.grants(), 6)
+
+        ObjectPermission.objects.grant_bulk([self.user.pk], self.view, FileMaster.objects.filter(pk__in=[obj.pk for obj in self.files]))
+        self.assertEqual(self.grants(), 6)
+
+    def test_revoke_bulk(self):
+        ObjectPermission.objects.grant_bulk([self.user, self.other], self.view, self.files)
+
+        self.assertEqual(ObjectPermission.objects.revoke_bulk([self.other], self.view, self.files[:1]), 1)
+        self.assertEqual(self.grants(), 5)
+
+        # Every object, chunk_size rows per DELETE
+        sql = self.sql(lambda: self.assertEqual(ObjectPermission.objects.revoke_bulk([self.user, self.other], self.view, chunk_size=2), 5))
+        self.assertEqual(sum(statement.startswith('DELETE') for statement in sql), 3)
+        self.assertEqual(self.grants(), 0)
+
+    def test_sync_for_object(self):
+        ObjectPermission.objects.grant_bulk([self.other], self.view, self.files[:1])
+        self.assertEqual(ObjectPermission.objects.sync_for_object(self.files[0], self.view, [self.user]), (1, 1))
+        self.assertEqual(list(ObjectPermission.objects.filter(object_id=self.files[0].pk).values_list('user_id', flat=True)), [self.user.pk])
+        self.assertEqual(ObjectPermission.objects.sync_for_object(self.files[0], self.view, [self.user]), (0, 0))
+
+    def test_prime_loads_every_grant_in_one_query(self):
+        ObjectPermission.objects.grant_bulk([self.user], self.view, self.files[:2])
+        resolver    =   PermissionResolver(self.user)
+        objects     =   [*self.files, self.open_file]
+        ContentType.objects.get_for_model(FileMaster)
+
+        self.assertEqual(len(self.sql(lambda: resolver.prime(objects, 'view_filemaster'))), 1)
+        with self.assertNumQueries(0):
+            permitted = [obj for obj in objects if resolver.has_object_permission(obj, 'view_filemaster')]
+        self.assertEqual(permitted, [*self.files[:2], self.open_file])
+
+    def test_filter_permitted(self):
+        ObjectPermission.objects.grant_bulk([self.user], self.view, self.files[:1])
+        self.assertEqual(
+            set(FileMaster.objects.filter_permitted(self.user, 'view_filemaster')),
+            {self.files[0], self.open_file},
+        )
+        self.assertEqual(set(FileMaster.objects.filter_permitted(self.other, 'view_filemaster')), {self.open_file})
+
+
+class MediaTestCase(WebTestCase):
+    '''
+    WebTestCase storing media files in a temporary directory.
+    '''
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root))
+
+
+# Range requests (web/views.py serve_field_file)
+class MediaRangeTests(MediaTestCase):
+
+    content = b'0123456789'
+
+    def setUp(self):
+        super().setUp()
+        self.file   =   FileMaster.objects.create(name='data', file=ContentFile(self.content, name='data.bin'))
+        self.url    =   self.file.media_url
+
+    def get(self, **headers):
+        response = self.client.get(self.url, **headers)
+        response.body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response
+
+    def test_parse_range(self):
+        for header, expected in (
+            ('bytes=2-4',       (2, 4)),
+            ('bytes=7-',        (7, 9)),
+            ('bytes=-3',        (7, 9)),
+            ('bytes=-30',       (0, 9)),
+            ('bytes=5-100',     (5, 9)),
+            ('bytes=20-30',     None),
+            ('bytes=4-2',       None),
+            ('bytes=-',         None),
+            ('bytes=1-2,4-5',   None),
+            ('items=1-2',       None),
+            (None,              None),
+        ):
+            with self.subTest(header=header):
+                self.assertEqual(views.parse_range(header, len(self.content)), expected)
+
+    def test_full_and_partial_content(self):
+        response = self.get()
+        self.assertEqual((response.status_code, response.body), (200, self.content))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        for header, body in (('bytes=2-4', b'234'), ('bytes=7-', b'789'), ('bytes=-3', b'789')):
+            with self.subTest(header=header):
+                response = self.get(HTTP_RANGE=header)
+                self.assertEqual((response.status_code, response.body), (206, body))
+                self.assertEqual(response['Content-Length'], str(len(body)))
+                self.assertEqual(response['Content-Range'], f'bytes {self.content.index(body)}-{self.content.index(body) + len(body) - 1}/10')
+
+    def test_unsatisfiable_range(self):
+        response = self.get(HTTP_RANGE='bytes=20-30')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+        # Not a single byte range: ignored, the whole file is sent
+        self.assertEqual(self.get(HTTP_RANGE='bytes=1-2,4-5').status_code, 200)
+
+    def test_if_range(self):
+        first = self.get()
+        self.assertEqual(self.get(HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE=first['ETag']).status_code, 206)
+        self.assertEqual(self.get(HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE=first['Last-Modified']).status_code, 206)
+
+        response = self.get(HTTP_RANGE='bytes=2-4', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, response.body), (200, self.content))
+
+    def test_not_modified(self):
+        first = self.get()
+        for headers in ({'HTTP_IF_NONE_MATCH': first['ETag']}, {'HTTP_IF_NONE_MATCH': '*'}, {'HTTP_IF_MODIFIED_SINCE': first['Last-Modified']}):
+            with self.subTest(headers=headers):
+                response = self.get(**headers)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], first['ETag'])
+
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+
+# Chunked uploads (web/uploads.py, web/views.py)
+class UploadTests(MediaTestCase):
+
+    content = b'abcdefghij'
+
+    def setUp(self):
+        super().setUp()
+        self.group.permissions.add(Permission.objects.get(codename='add_filemaster'))
+        self.enterContext(mock.patch('web.uploads.UPLOAD_TEMP_DIR', os.path.join(self.media_root, 'uploads')))
+
+    def create(self, **data):
+        data = {'filename': 'letters.txt', 'size': len(self.content), 'chunk_size': 4, **data}
+        return self.client.post('/api/uploads/', data, content_type='application/json')
+
+    def put_chunk(self, upload_id, index, **headers):
+        body = self.content[index * 4:index * 4 + 4]
+        return self.client.put(f'/api/uploads/{upload_id}/chunks/{index}/', body, content_type='application/octet-stream', **headers)
+
+    def complete(self, upload_id):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(f'/api/uploads/{upload_id}/complete/')
+
+    def test_chunks_in_any_order(self):
+        checksum    =   hashlib.sha256(self.content).hexdigest()
+        upload      =   self.create(checksum=checksum).json()
+        self.assertEqual(upload['total_chunks'], 3)
+
+        for index in (2, 0, 1):
+            self.assertEqual(self.put_chunk(upload['id'], index).status_code, 200)
+        self.assertEqual(self.client.get(f'/api/uploads/{upload["id"]}/').json()['received'], [0, 1, 2])
+
+        response = self.complete(upload['id'])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['checksum'], checksum)
+        with FileMaster.objects.get(pk=response.json()['id']).file.open('rb') as f:
+            self.assertEqual(f.read(), self.content)
+        # The temporary files are gone with the session
+        self.assertEqual(self.client.get(f'/api/uploads/{upload["id"]}/').status_code, 404)
+
+    def test_missing_chunks_and_double_complete_conflict(self):
+        upload_id = self.create().json()['id']
+        self.put_chunk(upload_id, 0)
+        self.assertEqual(self.complete(upload_id).status_code, 409)
+
+        self.put_chunk(upload_id, 1)
+        self.put_chunk(upload_id, 2)
+        # A complete() in progress holds the marker, a second call is refused
+        open(UploadSession.get(upload_id, self.user).completing_path, 'w').close()
+        self.assertEqual(self.complete(upload_id).status_code, 409)
+        self.assertFalse(FileMaster.objects.exists())
+
+    def test_checksum_mismatch(self):
+        upload_id = self.create(checksum='0' * 64).json()['id']
+        self.assertEqual(self.put_chunk(upload_id, 0, HTTP_X_CHUNK_CHECKSUM='0' * 64).status_code, 400)
+        self.assertNotIn(0, self.client.get(f'/api/uploads/{upload_id}/').json()['received'])
+
+        for index in range(3):
+            self.put_chunk(upload_id, index)
+        self.assertEqual(self.complete(upload_id).status_code, 409)
+        # Released again, a retry is not taken for a concurrent complete
+        self.assertEqual(self.complete(upload_id).json()['error'], 'File checksum mismatch')
+
+    def test_malformed_requests(self):
+        for data in ({'size': 'ten'}, {'size': True}, {'size': 0}, {'chunk_size': -1}, {'filename': ['a']}, {'checksum': 1}):
+            with self.subTest(data=data):
+                self.assertEqual(self.create(**data).status_code, 400)
+        self.assertEqual(self.client.post('/api/uploads/', '[1]', content_type='application/json').status_code, 400)
+
+        upload_id = self.create().json()['id']
+        self.assertEqual(self.put_chunk(upload_id, 3).status_code, 400)
+        # Short chunk
+        response = self.client.put(f'/api/uploads/{upload_id}/chunks/0/', b'ab', content_type='application/octet-stream')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/api/uploads/..%2F..%2Fetc/').status_code, 404)
@@ -0,0 +1,102 @@
+import io
+import os
+from concurrent.futures             import ThreadPoolExecutor
+
+from django.conf                    import settings
+from django.core.files.base         import ContentFile
+from django.db                      import connection, transaction
+
+from web                            import caching
+
+
+# Thumbnail settings, override in settings
+THUMBNAIL_SIZE          =   getattr(settings, 'THUMBNAIL_SIZE', (200, 200))
+THUMBNAIL_FORMATS       =   getattr(settings, 'THUMBNAIL_FORMATS', ('WEBP', 'JPEG'))
+THUMBNAIL_QUALITY       =   getattr(settings, 'THUMBNAIL_QUALITY', 80)
+THUMBNAIL_WORKERS       =   getattr(settings, 'THUMBNAIL_WORKERS', 2)
+THUMBNAIL_DIRECTORY     =   getattr(settings, 'THUMBNAIL_DIRECTORY', 'thumbnails/')
+
+EXTENSIONS              =   {'WEBP': 'webp', 'JPEG': 'jpg', 'PNG': 'png'}
+
+_executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix='thumbnail')
+
+
+def rendition_name(source_name, image_format, size=THUMBNAIL_SIZE):
+    stem = os.path.splitext(source_name)[0]
+    return f'{THUMBNAIL_DIRECTORY}{stem}_{size[0]}x{size[1]}.{EXTENSIONS[image_format]}'
+
+
+def render(field_file, size=THUMBNAIL_SIZE, formats=THUMBNAIL_FORMATS):
+    '''
+    Write fixed-size renditions of an image next to the original in its storage.
+    Returns {'source': name, FORMAT: {'path', 'width', 'height'}, ...} for the model's renditions field.
+    '''
+    # Pillow is only loaded by the processes that render
+    from PIL import Image, ImageOps
+
+    storage     =   field_file.storage
+    renditions  =   {'source': field_file.name}
+
+    with storage.open(field_file.name, 'rb') as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.thumbnail(size, Image.LANCZOS)
+
+        for image_format in formats:
+            output  =   io.BytesIO()
+            frame   =   image.convert('RGB') if image_format == 'JPEG' else image
+            frame.save(output, image_format, quality=THUMBNAIL_QUALITY, optimize=True)
+
+            name = rendition_name(field_file.name, image_format, size)
+            if storage.exists(name):
+                storage.delete(name)
+            name = storage.save(name, ContentFile(output.getvalue()))
+
+            renditions[image_format] = {'path': name, 'width': frame.width, 'height': frame.height}
+
+    return renditions
+
+
+def generate(model, pk):
+    '''
+    Render the thumbnails of one row and store them with update() (no save signals, no history row).
+    update() sends no post_save either, the API's table version is bumped here instead.
+    '''
+    # web.response_cache imports web.models, which imports this module
+    from web import response_cache
+
+    obj = model._default_manager.filter(pk=pk).first()
+    if obj is None or not obj.image:
+        return None
+
+    renditions = render(obj.image)
+    if model._default_manager.filter(pk=pk, image=renditions['source']).update(renditions=renditions):
+        caching.on_commit(lambda: response_cache.bump(model))
+    return renditions
+
+
+def generate_in_worker(model, pk, tenant=None):
+    # Worker threads have their own connection, point it at the tenant the row lives in
+    try:
+        if tenant is not None:
+            connection.set_tenant(tenant)
+        return generate(model, pk)
+    finally:
+        connection.close()
+
+
+def schedule(obj):
+    '''
+    Queue thumbnail generation for obj once the current transaction commits.
+    '''
+    tenant = getattr(connection, 'tenant', None)
+    transaction.on_commit(lambda: _executor.submit(generate_in_worker, type(obj), obj.pk, tenant))
+
+
+def needs_thumbnails(obj):
+    return bool(obj.image) and (obj.renditions or {}).get('source') != obj.image.name
+
+
+def delete(obj):
+    for image_format, rendition in (obj.renditions or {}).items():
+        if image_format != 'source' and obj.image.storage.exists(rendition['path']):
+            obj.image.storage.delete(rendition['path'])
@@ -0,0 +1,232 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+from django.conf                    import settings
+from django.core.files              import File
+from django.db                      import connection, transaction
+
+from web.models                     import FileMaster
+
+
+# Chunked upload settings, override in settings
+UPLOAD_TEMP_DIR             =   getattr(settings, 'CHUNKED_UPLOAD_TEMP_DIR', os.path.join(tempfile.gettempdir(), 'equisy-uploads'))
+UPLOAD_CHUNK_SIZE           =   getattr(settings, 'CHUNKED_UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024)
+UPLOAD_MAX_CHUNK_SIZE       =   getattr(settings, 'CHUNKED_UPLOAD_MAX_CHUNK_SIZE', 50 * 1024 * 1024)
+UPLOAD_MAX_SIZE             =   getattr(settings, 'CHUNKED_UPLOAD_MAX_SIZE', 5 * 1024 * 1024 * 1024)
+UPLOAD_SESSION_TTL          =   getattr(settings, 'CHUNKED_UPLOAD_SESSION_TTL', 60 * 60 * 24)
+UPLOAD_BUFFER_SIZE          =   64 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def integer(value, name):
+    '''
+    `value` as an int, from a JSON number or a string of digits, else UploadError.
+    '''
+    # bool is an int, JSON true must not pass as 1
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    raise UploadError(f'{name} must be an integer')
+
+
+def optional_string(value, name):
+    if value is not None and not isinstance(value, str):
+        raise UploadError(f'{name} must be a string')
+    return value
+
+
+class UploadSession:
+    '''
+    A resumable upload kept on local disk:
+        <UPLOAD_TEMP_DIR>/<schema>/<id>/meta.json   session details
+        <UPLOAD_TEMP_DIR>/<schema>/<id>/data        preallocated target, chunks are written at their offset
+        <UPLOAD_TEMP_DIR>/<schema>/<id>/parts/<n>   marker per received chunk (safe for parallel uploads)
+        <UPLOAD_TEMP_DIR>/<schema>/<id>/completing  created exclusively by complete(), one FileMaster per session
+    '''
+
+    def __init__(self, upload_id, meta):
+        self.id     =   upload_id
+        self.meta   =   meta
+        self.path   =   self.directory(upload_id)
+
+    # Paths
+    @staticmethod
+    def tenant_directory():
+        return os.path.join(UPLOAD_TEMP_DIR, getattr(connection, 'schema_name', 'public'))
+
+    @classmethod
+    def directory(cls, upload_id):
+        return os.path.join(cls.tenant_directory(), upload_id)
+
+    @property
+    def data_path(self):
+        return os.path.join(self.path, 'data')
+
+    def part_path(self, index):
+        return os.path.join(self.path, 'parts', str(index))
+
+    @property
+    def completing_path(self):
+        return os.path.join(self.path, 'completing')
+
+    # Lifecycle
+    @classmethod
+    def create(cls, user, filename, size, chunk_size=None, checksum=None, name=None):
+        size        =   integer(size, 'size')
+        chunk_size  =   integer(chunk_size, 'chunk_size') if chunk_size is not None else UPLOAD_CHUNK_SIZE
+        if not filename or not isinstance(filename, str):
+            raise UploadError('filename is required')
+        optional_string(checksum, 'checksum')
+        optional_string(name, 'name')
+        if not 0 < size <= UPLOAD_MAX_SIZE:
+            raise UploadError(f'size must be between 1 and {UPLOAD_MAX_SIZE} bytes')
+        if not 0 < chunk_size <= UPLOAD_MAX_CHUNK_SIZE:
+            raise UploadError(f'chunk_size must be between 1 and {UPLOAD_MAX_CHUNK_SIZE} bytes')
+
+        cls.cleanup_expired()
+
+        upload_id   =   uuid.uuid4().hex
+        meta        =   {
+            'user_id'       :   user.pk,
+            'filename'      :   os.path.basename(filename),
+            'name'          :   name or os.path.basename(filename),
+            'size'          :   size,
+            'chunk_size'    :   chunk_size,
+            'total_chunks'  :   (size + chunk_size - 1) // chunk_size,
+            'checksum'      :   checksum.lower() if checksum else None,
+            'created_at'    :   time.time(),
+        }
+        session = cls(upload_id, meta)
+
+        os.makedirs(os.path.join(session.path, 'parts'))
+        with open(session.data_path, 'wb') as f:
+            f.truncate(size)
+        with open(os.path.join(session.path, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+        return session
+
+    @classmethod
+    def get(cls, upload_id, user):
+        path = cls.directory(upload_id)
+        if not upload_id.isalnum() or not os.path.isdir(path):
+            raise UploadError('Upload session not found', status=404)
+
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta['user_id'] != user.pk:
+            raise UploadError('Upload session not found', status=404)
+
+        return cls(upload_id, meta)
+
+    @classmethod
+    def cleanup_expired(cls):
+        directory = cls.tenant_directory()
+        if not os.path.isdir(directory):
+            return
+        for upload_id in os.listdir(directory):
+            path = os.path.join(directory, upload_id)
+            if time.time() - os.path.getmtime(path) > UPLOAD_SESSION_TTL:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def abort(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    # Chunks
+    def received(self):
+        return sorted(int(part) for part in os.listdir(os.path.join(self.path, 'parts')))
+
+    def status(self):
+        return {
+            'id'            :   self.id,
+            'filename'      :   self.meta['filename'],
+            'size'          :   self.meta['size'],
+            'chunk_size'    :   self.meta['chunk_size'],
+            'total_chunks'  :   self.meta['total_chunks'],
+            'received'      :   self.received(),
+        }
+
+    def write_chunk(self, index, stream, checksum=None):
+        '''
+        Copy one chunk from `stream` into the data file at its offset, UPLOAD_BUFFER_SIZE bytes at a time.
+        '''
+        if not 0 <= index < self.meta['total_chunks']:
+            raise UploadError('Chunk index out of range')
+
+        offset      =   index * self.meta['chunk_size']
+        expected    =   min(self.meta['chunk_size'], self.meta['size'] - offset)
+        digest      =   hashlib.sha256()
+        written     =   0
+
+        # A re-sent chunk only counts again once it has been written completely
+        if os.path.exists(self.part_path(index)):
+            os.remove(self.part_path(index))
+
+        fd = os.open(self.data_path, os.O_WRONLY)
+        try:
+            while written < expected:
+                data = stream.read(min(UPLOAD_BUFFER_SIZE, expected - written))
+                if not data:
+                    break
+                os.pwrite(fd, data, offset + written)
+                digest.update(data)
+                written += len(data)
+        finally:
+            os.close(fd)
+
+        if written != expected or stream.read(1):
+            raise UploadError(f'Chunk {index} must be exactly {expected} bytes')
+        if checksum and digest.hexdigest() != checksum.lower():
+            raise UploadError(f'Chunk {index} checksum mismatch')
+
+        open(self.part_path(index), 'w').close()
+        os.utime(self.path)
+        return written
+
+    # Finalize
+    def file_checksum(self):
+        digest = hashlib.sha256()
+        with open(self.data_path, 'rb') as f:
+            for data in iter(lambda: f.read(UPLOAD_BUFFER_SIZE), b''):
+                digest.update(data)
+        return digest.hexdigest()
+
+    def complete(self, user):
+        # Exclusive create: of two concurrent calls only one gets past here and creates the FileMaster
+        try:
+            os.close(os.open(self.completing_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            raise UploadError('Upload is already being completed', status=409)
+
+        try:
+            missing = set(range(self.meta['total_chunks'])) - set(self.received())
+            if missing:
+                raise UploadError(f'{len(missing)} chunks missing', status=409)
+
+            checksum = self.file_checksum()
+            if self.meta['checksum'] and checksum != self.meta['checksum']:
+                raise UploadError('File checksum mismatch', status=409)
+
+            with transaction.atomic():
+                file_master = FileMaster(name=self.meta['name'], created_by=user, updated_by=user)
+                with open(self.data_path, 'rb') as f:
+                    file_master.file.save(self.meta['filename'], File(f), save=False)
+                file_master.save()
+                # Temp files go only once the row is committed, a failed finalize can be retried
+                transaction.on_commit(self.abort)
+        except BaseException:
+            os.remove(self.completing_path)
+            raise
+
+        return file_master, checksum
@@ -1,3 +1,331 @@
-from django.shortcuts import render
+import os
+import re
+import io
+import hashlib
+import json
+import mimetypes
+import contextvars
+from concurrent.futures             import ThreadPoolExecutor
+from urllib.parse                   import urlsplit
 
-# Create your views here.
+from django.conf                    import settings
+from django.core.exceptions         import PermissionDenied
+from django.core.handlers.wsgi      import WSGIRequest
+from django.db                      import connection
+from django.http                    import StreamingHttpResponse, HttpResponse, HttpResponseNotModified, Http404, JsonResponse
+from django.shortcuts               import get_object_or_404
+from django.urls                    import resolve, Resolver404
+from django.utils.http              import http_date, parse_http_date_safe, quote_etag, parse_etags
+from django.views.decorators.http   import require_http_methods
+
+from web.models                     import FileMaster, ImageMaster
+from web.uploads                    import UploadSession, UploadError
+
+
+# Media delivery settings, override in settings
+# MEDIA_OFFLOAD: None (stream from Python), 'x-accel-redirect' (nginx) or 'x-sendfile' (apache/lighttpd)
+MEDIA_CHUNK_SIZE        =   getattr(settings, 'MEDIA_CHUNK_SIZE', 64 * 1024)
+MEDIA_OFFLOAD           =   getattr(settings, 'MEDIA_OFFLOAD', None)
+MEDIA_OFFLOAD_PREFIX    =   getattr(settings, 'MEDIA_OFFLOAD_PREFIX', '/protected-media/')
+
+# Batch endpoint settings, override in settings
+# API_BATCH_WORKERS: threads used for "concurrent": true batches of reads
+API_BATCH_MAX_REQUESTS  =   getattr(settings, 'API_BATCH_MAX_REQUESTS', 50)
+API_BATCH_WORKERS       =   getattr(settings, 'API_BATCH_WORKERS', 4)
+
+RANGE_RE                =   re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def read_chunks(field_file, start, length, chunk_size=MEDIA_CHUNK_SIZE):
+    # Never hold more than one chunk of the file in memory
+    with field_file.storage.open(field_file.name, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def parse_range(header, size):
+    '''
+    (start, end) for a single 'bytes=' range, None when absent or not satisfiable as one range.
+    '''
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match or not (match[1] or match[2]):
+        return None
+
+    if match[1]:
+        start   =   int(match[1])
+        end     =   min(int(match[2]), size - 1) if match[2] else size - 1
+    else:
+        # Suffix range: the last N bytes
+        start   =   max(0, size - int(match[2]))
+        end     =   size - 1
+
+    return (start, end) if start <= end else None
+
+
+def serve_field_file(request, obj, field_file):
+    storage         =   field_file.storage
+    size            =   field_file.size
+    modified        =   obj.updated_at or storage.get_modified_time(field_file.name)
+    last_modified   =   int(modified.timestamp())
+    etag            =   quote_etag(hashlib.md5(f'{field_file.name}:{size}:{last_modified}'.encode()).hexdigest())
+
+    # Conditional GET
+    if_none_match       =   request.headers.get('If-None-Match')
+    if_modified_since   =   parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    if (if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == '*')) or (
+        not if_none_match and if_modified_since and last_modified <= if_modified_since
+    ):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+
+    filename = os.path.basename(field_file.name)
+
+    if MEDIA_OFFLOAD:
+        # The web server sends the bytes, the app only checks permissions
+        response = HttpResponse(content_type='')
+        if MEDIA_OFFLOAD == 'x-accel-redirect':
+            response['X-Accel-Redirect'] = MEDIA_OFFLOAD_PREFIX + field_file.name
+        else:
+            response['X-Sendfile'] = storage.path(field_file.name)
+    else:
+        range_header = request.headers.get('Range')
+
+        # If-Range: only honour the range when the client still has this version
+        if_range = request.headers.get('If-Range')
+        if range_header and if_range and if_range != etag and parse_http_date_safe(if_range) != last_modified:
+            range_header = None
+
+        byte_range = parse_range(range_header, size)
+        if range_header and byte_range is None and RANGE_RE.match(range_header.strip()):
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        start, end  =   byte_range or (0, size - 1)
+        length      =   end - start + 1
+        response    =   StreamingHttpResponse(read_chunks(field_file, start, length), status=206 if byte_range else 200)
+        response['Content-Length'] = str(length)
+        if byte_range:
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Type'] = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    response['Accept-Ranges']       =   'bytes'
+    response['ETag']                =   etag
+    response['Last-Modified']       =   http_date(last_modified)
+    response['Cache-Control']       =   'private, max-age=0, must-revalidate'
+    response['Content-Disposition'] =   f'inline; filename="{filename}"'
+    return response
+
+
+def media_view(model, field_name):
+    '''
+    View serving `field_name` of a `model` row in the current tenant, after check_object_permission.
+    '''
+    def view(request, pk):
+        if request.method not in ('GET', 'HEAD'):
+            return HttpResponse(status=405)
+
+        obj         =   get_object_or_404(model, pk=pk)
+        field_file  =   getattr(obj, field_name)
+        if not field_file:
+            raise Http404
+
+        if not obj.check_object_permission(request.user, f'view_{model._meta.model_name}'):
+            raise PermissionDenied
+
+        return serve_field_file(request, obj, field_file)
+
+    view.__name__ = f'{model._meta.model_name}_{field_name}_media'
+    return view
+
+
+file_master_media   =   media_view(FileMaster, 'file')
+image_master_media  =   media_view(ImageMaster, 'image')
+
+
+# Chunked uploads
+def upload_view(view):
+    '''
+    Authentication, add_filemaster permission and UploadError -> JSON for the upload endpoints.
+    '''
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+        if not request.user.has_perm('web.add_filemaster'):
+            return JsonResponse({'error': 'Permission denied'}, status=403)
+        try:
+            return view(request, *args, **kwargs)
+        except UploadError as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+
+    wrapper.__name__ = view.__name__
+    return wrapper
+
+
+@require_http_methods(['POST'])
+@upload_view
+def upload_create(request):
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        raise UploadError('JSON object with filename and size is required')
+
+    session = UploadSession.create(
+        request.user,
+        filename    =   data.get('filename'),
+        size        =   data.get('size'),
+        chunk_size  =   data.get('chunk_size'),
+        checksum    =   data.get('checksum'),
+        name        =   data.get('name'),
+    )
+    return JsonResponse(session.status(), status=201)
+
+
+@require_http_methods(['GET', 'DELETE'])
+@upload_view
+def upload_detail(request, upload_id):
+    session = UploadSession.get(upload_id, request.user)
+    if request.method == 'DELETE':
+        session.abort()
+        return HttpResponse(status=204)
+    return JsonResponse(session.status())
+
+
+@require_http_methods(['PUT'])
+@upload_view
+def upload_chunk(request, upload_id, index):
+    session = UploadSession.get(upload_id, request.user)
+    # The body is read from the socket in small blocks, never as a whole
+    written = session.write_chunk(index, request, checksum=request.headers.get('X-Chunk-Checksum'))
+    return JsonResponse({'index': index, 'size': written})
+
+
+@require_http_methods(['POST'])
+@upload_view
+def upload_complete(request, upload_id):
+    session                 =   UploadSession.get(upload_id, request.user)
+    file_master, checksum   =   session.complete(request.user)
+    return JsonResponse({'id': file_master.pk, 'name': file_master.name, 'url': file_master.media_url, 'checksum': checksum}, status=201)
+
+
+# Batch requests
+SAFE_METHODS        =   ('GET', 'HEAD', 'OPTIONS')
+BATCH_HEADERS       =   ('If-None-Match', 'If-Modified-Since', 'Accept')
+
+
+def sub_request(request, spec):
+    '''
+    A request for one batch entry. It shares META (cookies, Authorization, CSRF token), the session,
+    the user and the tenant of the batch request; middleware is not run again.
+    '''
+    method  =   str(spec.get('method', 'GET')).upper()
+    url     =   urlsplit(str(spec.get('path', '')))
+    body    =   json.dumps(spec['body']).encode() if spec.get('body') is not None else b''
+
+    environ = {
+        key: value for key, value in request.META.items()
+        if not key.startswith('HTTP_') or key in ('HTTP_HOST', 'HTTP_COOKIE', 'HTTP_AUTHORIZATION', 'HTTP_X_CSRFTOKEN', 'HTTP_ORIGIN', 'HTTP_REFERER')
+    }
+    environ.update({
+        'REQUEST_METHOD'    :   method,
+        'PATH_INFO'         :   url.path,
+        'QUERY_STRING'      :   url.query,
+        'CONTENT_TYPE'      :   'application/json',
+        'CONTENT_LENGTH'    :   str(len(body)),
+        'wsgi.input'        :   io.BytesIO(body),
+    })
+    for header in BATCH_HEADERS:
+        value = (spec.get('headers') or {}).get(header)
+        if value:
+            environ['HTTP_' + header.upper().replace('-', '_')] = value
+
+    sub = WSGIRequest(environ)
+    for attribute in ('user', 'session', 'tenant', 'urlconf'):
+        if hasattr(request, attribute):
+            setattr(sub, attribute, getattr(request, attribute))
+    return sub
+
+
+def run_sub_request(request, spec):
+    try:
+        sub     =   sub_request(request, spec)
+        match   =   resolve(sub.path_info, urlconf=getattr(request, 'urlconf', None))
+    except Resolver404:
+        return {'status': 404, 'headers': {}, 'body': {'detail': 'Not found.'}}
+
+    if match.func is batch:
+        return {'status': 400, 'headers': {}, 'body': {'detail': 'Batches cannot be nested.'}}
+
+    try:
+        response = match.func(sub, *match.args, **match.kwargs)
+    except Http404:
+        return {'status': 404, 'headers': {}, 'body': {'detail': 'Not found.'}}
+    except PermissionDenied:
+        return {'status': 403, 'headers': {}, 'body': {'detail': 'Permission denied.'}}
+
+    if response.streaming:
+        return {'status': 400, 'headers': {}, 'body': {'detail': 'Streaming responses are not available in a batch.'}}
+    if hasattr(response, 'render'):
+        response.render()
+
+    content_type    =   response.get('Content-Type', '')
+    content         =   response.content.decode(response.charset or 'utf-8')
+    return {
+        'status'    :   response.status_code,
+        'headers'   :   {header: response[header] for header in ('ETag', 'Last-Modified', 'Content-Type', 'Location') if response.has_header(header)},
+        'body'      :   json.loads(content) if content and 'json' in content_type else content,
+    }
+
+
+def run_in_thread(request, spec):
+    # Worker threads have their own connection, point it at the tenant and close it afterwards
+    connection.set_tenant(request.tenant)
+    try:
+        return run_sub_request(request, spec)
+    finally:
+        connection.close()
+
+
+@require_http_methods(['POST'])
+def batch(request):
+    '''
+    POST {"requests": [{"id", "method", "path", "body", "headers"}, ...], "concurrent": false}
+    -> {"responses": [{"id", "status", "headers", "body"}, ...]} in the same order.
+
+    Entries run one after the other against the same tenant and session user. With "concurrent": true
+    and only reads, they run in API_BATCH_WORKERS threads. Entries skip the middleware, so the batch
+    request itself passes CsrfViewMiddleware (X-CSRFToken header) and must be authenticated.
+    '''
+    # Also loads the user once, here, instead of in each worker thread
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    try:
+        data    =   json.loads(request.body)
+        specs   =   data['requests']
+        if not isinstance(specs, list) or not all(isinstance(spec, dict) for spec in specs):
+            raise ValueError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'JSON body with a "requests" list is required'}, status=400)
+
+    if len(specs) > API_BATCH_MAX_REQUESTS:
+        return JsonResponse({'error': f'At most {API_BATCH_MAX_REQUESTS} requests per batch'}, status=400)
+
+    reads_only = all(str(spec.get('method', 'GET')).upper() in SAFE_METHODS for spec in specs)
+    if data.get('concurrent') and reads_only and len(specs) > 1 and hasattr(request, 'tenant'):
+        # Threads see the same request scoped caches (permission grants) as this one
+        with ThreadPoolExecutor(max_workers=min(API_BATCH_WORKERS, len(specs))) as executor:
+            futures     =   [executor.submit(contextvars.copy_context().run, run_in_thread, request, spec) for spec in specs]
+            responses   =   [future.result() for future in futures]
+    else:
+        responses = [run_sub_request(request, spec) for spec in specs]
+
+    return JsonResponse({'responses': [{'id': spec.get('id', index), **response} for index, (spec, response) in enumerate(zip(specs, responses))]})